@@ -4,8 +4,10 @@ Braindump API Server
 A simple Flask server providing REST API for the Braindump knowledge base.
 """
 
+import atexit
 import json
 import os
+import signal
 from pathlib import Path
 from datetime import datetime
 import uuid
@@ -20,7 +22,10 @@ from server.embeddings import EmbeddingManager
 from server.llm import LLMManager, OpenRouterProvider, resolve_env_var
 from server.consolidation import ConsolidationManager
 from server.auth import AuthManager, require_auth
-from server.pending_commits import PendingCommitManager, commit_uncommitted_on_startup
+from server.pending_commits import (
+    PendingCommitManager, commit_uncommitted_on_startup, enable_status_caches, mark_clean_shutdown,
+    pending_log_path,
+)
 
 load_dotenv()
 
@@ -78,7 +83,9 @@ git_ops = GitOps(REPO_PATH)
 # Initialize pending commits manager for debounced git commits
 git_config = config.get('git', {})
 pending_commits = PendingCommitManager(
-    debounce_minutes=git_config.get('commit_debounce_minutes', 5)
+    debounce_minutes=git_config.get('commit_debounce_minutes', 5),
+    quiet_seconds=git_config.get('commit_quiet_seconds', 30),
+    log_path=pending_log_path(REPO_PATH),
 )
 
 # Initialize embedding manager (lazy - only loads model when needed)
@@ -105,6 +112,25 @@ def get_llm_manager():
         llm_manager = LLMManager(config.get('llm', {}))
     return llm_manager
 
+# OpenRouter provider for LLM search, kept across requests to reuse its connections
+search_provider = None
+
+def get_search_provider(api_key: str):
+    """Get the search provider, recreating it if the search settings changed."""
+    global search_provider
+    llm_config = config.get('llm', {})
+    search_model = config.get('search', {}).get('search_model', 'google/gemini-2.5-flash-lite')
+    if (search_provider is None
+            or search_provider.model != search_model
+            or search_provider.api_key != api_key):
+        search_provider = OpenRouterProvider(
+            model=search_model,
+            api_key=api_key,
+            site_url=llm_config.get('site_url', ''),
+            site_name=llm_config.get('site_name', 'Braindump'),
+        )
+    return search_provider
+
 def get_consolidation_manager():
     """Get or initialize the consolidation manager."""
     global consolidation_manager
@@ -189,6 +215,18 @@ def logout():
 
 # --- Document API ---
 
+# Characters of the first line read for a title; a note captured as one long line
+# shouldn't be read in full just to list it
+TITLE_READ_LIMIT = 1024
+
+def read_title(md_file: Path) -> str:
+    """Read a document's title from the head of its first line."""
+    with open(md_file, 'r', encoding='utf-8') as f:
+        first_line = f.readline(TITLE_READ_LIMIT).strip()
+    # Remove markdown heading prefix if present
+    return first_line.lstrip('#').strip() or md_file.stem
+
+
 @app.route('/api/documents', methods=['GET'])
 @require_auth(auth_manager)
 def list_documents():
@@ -203,11 +241,7 @@ def list_documents():
     # Only list non-archived documents (files in root, not in archive folder)
     for md_file in REPO_PATH.glob('*.md'):
         stat = md_file.stat()
-        # Read first line for title
-        with open(md_file, 'r', encoding='utf-8') as f:
-            first_line = f.readline().strip()
-            # Remove markdown heading prefix if present
-            title = first_line.lstrip('#').strip() or md_file.stem
+        title = read_title(md_file)
 
         documents.append({
             'id': md_file.stem,
@@ -234,11 +268,7 @@ def list_archived_documents():
 
     for md_file in archive_path.glob('*.md'):
         stat = md_file.stat()
-        # Read first line for title
-        with open(md_file, 'r', encoding='utf-8') as f:
-            first_line = f.readline().strip()
-            # Remove markdown heading prefix if present
-            title = first_line.lstrip('#').strip() or md_file.stem
+        title = read_title(md_file)
 
         documents.append({
             'id': md_file.stem,
@@ -404,8 +434,10 @@ def delete_document(doc_id):
 @require_auth(auth_manager)
 def archive_document(doc_id):
     """Archive a document by moving it to the archive folder."""
-    # Flush any old pending commits before this action
+    # Flush any old pending commits before this action, and let them land
+    # before the file moves so its last edits are committed
     pending_commits.flush_if_ready(git_ops)
+    pending_commits.wait_drained()
 
     filepath = REPO_PATH / f"{doc_id}.md"
 
@@ -462,17 +494,10 @@ def search_documents():
     search_mode = config.get('search', {}).get('mode', 'llm')
 
     if search_mode == 'llm':
-        llm_config = config.get('llm', {})
-        api_key = resolve_env_var(llm_config.get('api_key', ''))
+        api_key = resolve_env_var(config.get('llm', {}).get('api_key', ''))
         if not api_key:
             return jsonify({'error': 'No API key configured for LLM search. Add an OpenRouter API key in Settings.'}), 503
-        search_model = config.get('search', {}).get('search_model', 'google/gemini-2.5-flash-lite')
-        provider = OpenRouterProvider(
-            model=search_model,
-            api_key=api_key,
-            site_url=llm_config.get('site_url', ''),
-            site_name=llm_config.get('site_name', 'Braindump'),
-        )
+        provider = get_search_provider(api_key)
         try:
             results = indexer.llm_search(query, provider, limit=limit, include_archived=include_archived)
         except RuntimeError as e:
@@ -538,9 +563,10 @@ def recent_summary():
     completed_todos = indexer.get_recent_completed_todos(hours=recency_hours)
 
     # Get all open TODOs sorted by age (oldest first for priority)
-    all_todos = indexer.get_all_todos(include_done=False)
-    # Sort by created_at ascending (oldest first)
-    all_todos.sort(key=lambda t: t.get('created_at', 0))
+    all_todos = indexer.get_all_todos(include_done=False, as_dict=False)
+    # Sort by created_at ascending (oldest first); only the ones shown become dicts
+    all_todos.sort(key=lambda t: t['created_at'])
+    all_todos = [dict(row) for row in all_todos[:10]]
 
     # Get open questions
     questions = indexer.get_all_questions(include_resolved=False)
@@ -567,7 +593,7 @@ def recent_summary():
             'todos_completed': completed_todos,
             'todos_completed_count': len(completed_todos),
         },
-        'open_todos': all_todos[:10],  # Limit to first 10 for display
+        'open_todos': all_todos,  # Limited to first 10 for display
         'open_todos_count': stats['open_todos'],
         'suggested_next': suggested_next,
         'open_questions': questions,
@@ -772,7 +798,8 @@ def get_config():
             'autosave_delay_ms': config.get('ui', {}).get('autosave_delay_ms', 500)
         },
         'git': {
-            'commit_debounce_minutes': config.get('git', {}).get('commit_debounce_minutes', 5)
+            'commit_debounce_minutes': config.get('git', {}).get('commit_debounce_minutes', 5),
+            'commit_quiet_seconds': config.get('git', {}).get('commit_quiet_seconds', 30)
         },
         'search': {
             'mode': config.get('search', {}).get('mode', 'llm'),
@@ -823,6 +850,10 @@ def update_config():
             new_debounce = int(data['git']['commit_debounce_minutes'])
             config.setdefault('git', {})['commit_debounce_minutes'] = new_debounce
             pending_commits.debounce_minutes = new_debounce
+        if 'commit_quiet_seconds' in data['git']:
+            new_quiet = int(data['git']['commit_quiet_seconds'])
+            config.setdefault('git', {})['commit_quiet_seconds'] = new_quiet
+            pending_commits.quiet_seconds = new_quiet
 
     if 'search' in data:
         if 'mode' in data['search']:
@@ -834,10 +865,11 @@ def update_config():
     with open(CONFIG_PATH, 'w') as f:
         json.dump(config, f, indent=2)
 
-    # Reset LLM manager to pick up new config
-    global llm_manager, consolidation_manager
+    # Reset LLM manager and search provider to pick up new config
+    global llm_manager, consolidation_manager, search_provider
     llm_manager = None
     consolidation_manager = None
+    search_provider = None
 
     return jsonify({'success': True})
 
@@ -884,6 +916,7 @@ def get_pending_commits():
     """Get status of pending git commits."""
     stats = pending_commits.get_stats()
     stats['debounce_minutes'] = pending_commits.debounce_minutes
+    stats['quiet_seconds'] = pending_commits.quiet_seconds
     return jsonify(stats)
 
 
@@ -914,12 +947,27 @@ def health_check():
 
 # --- Main ---
 
+def handle_sigterm(signum, frame):
+    """Exit normally on SIGTERM (e.g. systemd stop) so atexit handlers run."""
+    raise SystemExit(0)
+
+
+def shutdown():
+    """Let queued commits finish, and note a clean stop if nothing is pending."""
+    pending_commits.wait_drained()
+    if not pending_commits.has_pending():
+        mark_clean_shutdown(REPO_PATH)
+
+
 def main():
     """Entry point for the Braindump server."""
     # Initialize git repo if needed
     if not git_ops.is_initialized():
         git_ops.initialize()
         print(f"Initialized git repository at {REPO_PATH}")
+    enable_status_caches(git_ops)
+    atexit.register(shutdown)
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
     # Commit any uncommitted files from previous session
     startup_commit = commit_uncommitted_on_startup(git_ops, REPO_PATH)
@@ -6,11 +6,26 @@ Supports local models (sentence-transformers) and can be extended for API-based
 """
 
 import hashlib
+import re
 import numpy as np
+from functools import lru_cache
 from typing import Optional
 from pathlib import Path
 
 
+# Longest text passed to the model; local models truncate to a few hundred
+# tokens anyway, so anything past this only costs tokenization time
+MAX_EMBEDDING_CHARS = 2000
+
+# Recent search queries whose embeddings are kept, so repeated searches skip the model
+QUERY_CACHE_SIZE = 256
+
+_MARKDOWN_LINK = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+_MARKDOWN_LINE_PREFIX = re.compile(r'^[ \t]*(?:#{1,6}|[-+*]|\d+\.|>)[ \t]+', re.MULTILINE)
+_MARKDOWN_EMPHASIS = re.compile(r'\*\*|__|\*|`+|~~')
+_WHITESPACE = re.compile(r'\s+')
+
+
 class EmbeddingProvider:
     """Base class for embedding providers."""
 
@@ -64,6 +79,7 @@ class EmbeddingManager:
     def __init__(self, config: dict):
         self.config = config
         self.provider = None
+        self._query_embeddings = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._embed_query)
         self._init_provider()
 
     def _init_provider(self):
@@ -86,12 +102,31 @@ class EmbeddingManager:
             raise RuntimeError("No embedding provider configured")
         return self.provider.embed(text)
 
+    def get_query_embedding(self, query: str) -> np.ndarray:
+        """Embed a search query, reusing the vector for recently seen queries."""
+        return self._query_embeddings(query)
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        embedding = np.asarray(self.get_embedding(query), dtype=np.float32)
+        # Shared between callers through the cache, so keep it read-only
+        embedding.flags.writeable = False
+        return embedding
+
     def get_embeddings(self, texts: list[str]) -> list[list[float]]:
         """Generate embeddings for multiple texts."""
         if not self.provider:
             raise RuntimeError("No embedding provider configured")
         return self.provider.embed_batch(texts)
 
+    @staticmethod
+    def prepare_text(content: str, max_chars: int = MAX_EMBEDDING_CHARS) -> str:
+        """Strip markdown syntax, collapse whitespace and truncate text for embedding."""
+        text = _MARKDOWN_LINK.sub(r'\1', content)
+        text = _MARKDOWN_LINE_PREFIX.sub('', text)
+        text = _MARKDOWN_EMPHASIS.sub('', text)
+        text = _WHITESPACE.sub(' ', text).strip()
+        return text[:max_chars]
+
     @staticmethod
     def content_hash(content: str) -> str:
         """Generate a hash of content for caching."""
@@ -118,16 +153,56 @@ class EmbeddingManager:
         Returns:
             List of (doc_id, similarity_score) tuples, sorted by similarity
         """
-        query_embedding = self.get_embedding(query)
+        if not embeddings:
+            return []
+        doc_ids = [doc_id for doc_id, _ in embeddings]
+        matrix = np.array([embedding for _, embedding in embeddings], dtype=np.float32)
+        return self.search_matrix(query, doc_ids, matrix, top_k=top_k, min_similarity=min_similarity)
+
+    def search_matrix(self, query: str, doc_ids: list[str], matrix: np.ndarray,
+                      top_k: int = 10, min_similarity: float = 0.25,
+                      normalized: bool = False,
+                      mask: Optional[np.ndarray] = None) -> list[tuple[str, float]]:
+        """
+        Search for similar documents in a precomputed embedding matrix.
+
+        Scores every document with a single matrix-vector product.
+
+        Args:
+            query: The search query
+            doc_ids: Document IDs, one per matrix row
+            matrix: Array of shape (len(doc_ids), dimension)
+            top_k: Number of results to return
+            min_similarity: Minimum similarity score to include in results (default 0.25)
+            normalized: Whether matrix rows are already L2-normalized
+            mask: Optional boolean array, one per row; rows where it is False are skipped
+
+        Returns:
+            List of (doc_id, similarity_score) tuples, sorted by similarity
+        """
+        if len(doc_ids) == 0 or top_k <= 0:
+            return []
+
+        query_embedding = self.get_query_embedding(query)
+        similarities = matrix @ (query_embedding / np.linalg.norm(query_embedding))
+        if not normalized:
+            similarities /= np.linalg.norm(matrix, axis=1)
+        if mask is not None:
+            # Scoring every row and discarding some is cheaper than copying the kept rows
+            similarities[~mask] = -np.inf
+
+        # Only the top_k candidates need to be fully sorted
+        if top_k < len(similarities):
+            candidates = np.argpartition(-similarities, top_k)[:top_k]
+        else:
+            candidates = np.arange(len(similarities))
+        candidates = candidates[np.argsort(-similarities[candidates])]
 
         results = []
-        for doc_id, doc_embedding in embeddings:
-            similarity = self.cosine_similarity(query_embedding, doc_embedding)
+        for i in candidates:
+            similarity = float(similarities[i])
             # Only include results above the minimum threshold
             if similarity >= min_similarity:
-                results.append((doc_id, similarity))
-
-        # Sort by similarity (highest first)
-        results.sort(key=lambda x: x[1], reverse=True)
+                results.append((doc_ids[i], similarity))
 
-        return results[:top_k]
+        return results
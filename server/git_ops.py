@@ -4,17 +4,31 @@ Git operations for Braindump.
 Handles repository initialization, commits, and branching for the notes storage.
 """
 
+import functools
+import threading
 from pathlib import Path
 from git import Repo, InvalidGitRepositoryError
 from git.exc import GitCommandError
 
 
+def _locked(method):
+    """Run a GitOps method while holding the repository write lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class GitOps:
     """Manages git operations for the notes repository."""
 
     def __init__(self, repo_path: Path):
         self.repo_path = Path(repo_path)
         self.repo = None
+        # Serializes index writes between request handlers and the
+        # background commit thread
+        self.lock = threading.RLock()
         self._load_repo()
 
     def _load_repo(self):
@@ -29,6 +43,7 @@ class GitOps:
         """Check if the repository is initialized."""
         return self.repo is not None
 
+    @_locked
     def initialize(self) -> bool:
         """Initialize a new git repository."""
         self.repo_path.mkdir(parents=True, exist_ok=True)
@@ -39,25 +54,28 @@ class GitOps:
         gitignore_path.write_text('# Braindump notes repository\n.DS_Store\n')
 
         # Initial commit
-        self.repo.index.add(['.gitignore'])
+        self.repo.index.add('.gitignore')
         self.repo.index.commit('Initialize notes repository')
 
         return True
 
+    @_locked
     def commit_file(self, filename: str, message: str, delete: bool = False):
         """Commit a single file change."""
         if not self.repo:
             return False
 
         try:
+            # Reuse one IndexFile so the index is only parsed once
+            index = self.repo.index
             if delete:
                 # Stage deletion
-                self.repo.index.remove([filename])
+                index.remove(filename)
             else:
                 # Stage addition/modification
-                self.repo.index.add([filename])
+                index.add(filename)
 
-            self.repo.index.commit(message)
+            index.commit(message)
             return True
         except GitCommandError as e:
             print(f"Git commit error: {e}")
@@ -93,6 +111,7 @@ class GitOps:
         except GitCommandError:
             return False
 
+    @_locked
     def checkout_branch(self, branch_name: str) -> bool:
         """Checkout an existing branch."""
         if not self.repo:
@@ -110,6 +129,7 @@ class GitOps:
             return ''
         return self.repo.active_branch.name
 
+    @_locked
     def merge_branch(self, branch_name: str) -> bool:
         """Merge a branch into current branch."""
         if not self.repo:
@@ -159,6 +179,7 @@ class GitOps:
         except GitCommandError:
             return []
 
+    @_locked
     def move_to_archive(self, filename: str) -> bool:
         """Move a file to the archive folder."""
         if not self.repo:
@@ -173,8 +194,9 @@ class GitOps:
             gitkeep = archive_dir / '.gitkeep'
             if not gitkeep.exists():
                 gitkeep.touch()
-                self.repo.index.add(['archive/.gitkeep'])
-                self.repo.index.commit("Create archive folder")
+                index = self.repo.index
+                index.add('archive/.gitkeep')
+                index.commit("Create archive folder")
 
             # Move file using git mv (use relative paths)
             source = self.repo_path / filename
@@ -188,6 +210,7 @@ class GitOps:
             print(f"Git move error: {e}")
             return False
 
+    @_locked
     def move_from_archive(self, filename: str) -> bool:
         """Move a file from the archive folder back to main."""
         if not self.repo:
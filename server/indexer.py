@@ -5,37 +5,377 @@ SQLite-based index for fast queries, TODO extraction, and semantic search.
 The index is derived from the git repository and can be rebuilt at any time.
 """
 
+import os
 import sqlite3
+import hashlib
 import json
 import re
+import functools
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+READ_CHUNK_SIZE = 64 * 1024
+# Length of the stored document snippet shown in search results
+SNIPPET_LENGTH = 200
+# Threads reading files ahead of the indexing loop during rebuild_index
+READ_WORKERS = 4
+# Reads kept queued ahead of the indexing loop, bounding file contents held in memory
+READ_AHEAD = 2 * READ_WORKERS
+
+# Below this many embeddings an exact scan is fast enough and loses no recall
+ANN_MIN_DOCUMENTS = 5000
+# Same cut-off EmbeddingManager.search_matrix applies to exact results
+MIN_SEMANTIC_SIMILARITY = 0.25
+# Rows of removed documents stay in the embedding matrix (and ANN graph) as
+# tombstones; past this fraction the matrix is reloaded to compact them
+EMB_TOMBSTONE_LIMIT = 0.25
+
+# Hot-path statements, kept as constants so every call reuses the same
+# string and hits sqlite3's prepared statement cache
+_UPSERT_DOC_SQL = '''
+    INSERT INTO documents (id, filename, title, content_hash, created_at, modified_at, indexed_at, snippet)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        filename = excluded.filename,
+        title = excluded.title,
+        content_hash = excluded.content_hash,
+        modified_at = excluded.modified_at,
+        indexed_at = excluded.indexed_at,
+        snippet = excluded.snippet
+'''
+
+_UPSERT_FTS_SQL = '''
+    INSERT OR REPLACE INTO documents_fts (rowid, doc_id, filename, title, content)
+    SELECT rowid, ?, ?, ?, ? FROM documents WHERE id = ?
+'''
+
+_INSERT_TODO_SQL = '''
+    INSERT INTO todos (document_id, line_number, todo_type, text, is_done, created_at,
+                       document_title, filename, archived)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+_INSERT_QUESTION_SQL = '''
+    INSERT INTO questions (document_id, line_number, text, created_at,
+                           document_title, filename, archived)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+_UPSERT_EMBEDDING_SQL = '''
+    INSERT INTO embeddings (document_id, content_hash, input_hash, embedding, created_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(document_id) DO UPDATE SET
+        content_hash = excluded.content_hash,
+        input_hash = excluded.input_hash,
+        embedding = excluded.embedding,
+        created_at = excluded.created_at
+'''
+
+# Secondary indexes that nothing reads while documents are being indexed, kept in
+# one place so rebuild_index can drop them while it reloads emptied tables and
+# build each one once afterwards (document_id lookups keep their indexes in _init_db)
+_SECONDARY_INDEXES = {
+    # Archived plus recency; also serves plain archived lookups
+    'idx_docs_archived_modified': 'documents(archived, modified_at DESC)',
+    # Open TODO/question listings come back already sorted by created_at
+    'idx_todos_done_created': 'todos(is_done, created_at DESC)',
+    'idx_questions_resolved_created': 'questions(is_resolved, created_at DESC)',
+    # Covers the is_done filter and the join to documents
+    'idx_todos_done_doc': 'todos(is_done, document_id)',
+}
+
+# Listing queries for every combination of the getters' include_* flags
+_TODOS_SQL = {
+    # (include_done, include_archived)
+    (False, False): 'SELECT * FROM todos WHERE is_done = 0 AND archived = 0 ORDER BY created_at DESC',
+    (False, True): 'SELECT * FROM todos WHERE is_done = 0 ORDER BY created_at DESC',
+    (True, False): 'SELECT * FROM todos WHERE archived = 0 ORDER BY created_at DESC',
+    (True, True): 'SELECT * FROM todos ORDER BY created_at DESC',
+}
+
+_QUESTIONS_SQL = {
+    # (include_resolved, include_archived)
+    (False, False): 'SELECT * FROM questions WHERE is_resolved = 0 AND archived = 0 ORDER BY created_at DESC',
+    (False, True): 'SELECT * FROM questions WHERE is_resolved = 0 ORDER BY created_at DESC',
+    (True, False): 'SELECT * FROM questions WHERE archived = 0 ORDER BY created_at DESC',
+    (True, True): 'SELECT * FROM questions ORDER BY created_at DESC',
+}
+
+_RECENT_DOCUMENTS_SQL = {
+    # include_archived
+    False: '''
+        SELECT id, filename, title, modified_at FROM documents
+        WHERE modified_at >= ? AND archived = 0
+        ORDER BY modified_at DESC
+    ''',
+    True: '''
+        SELECT id, filename, title, modified_at FROM documents
+        WHERE modified_at >= ?
+        ORDER BY modified_at DESC
+    ''',
+}
+
+# FTS5 candidates for _text_search, ranked by BM25 with title hits weighted
+# like the scoring applied afterwards (columns: doc_id, filename, title, content)
+_TEXT_SEARCH_SQL = {
+    # include_archived
+    False: '''
+        SELECT d.id, d.filename, d.title, d.modified_at, d.archived, f.content
+        FROM documents_fts f
+        JOIN documents d ON d.rowid = f.rowid
+        WHERE documents_fts MATCH ? AND d.archived = 0
+        ORDER BY bm25(documents_fts, 0.0, 1.0, 3.0, 1.0) LIMIT ?
+    ''',
+    True: '''
+        SELECT d.id, d.filename, d.title, d.modified_at, d.archived, f.content
+        FROM documents_fts f
+        JOIN documents d ON d.rowid = f.rowid
+        WHERE documents_fts MATCH ?
+        ORDER BY bm25(documents_fts, 0.0, 1.0, 3.0, 1.0) LIMIT ?
+    ''',
+}
+
+# All counts in one statement; todos/questions carry their document's archived flag
+_STATS_SQL = {
+    # include_archived
+    False: '''
+        SELECT
+            (SELECT COUNT(*) FROM documents WHERE archived = 0) AS documents,
+            (SELECT COUNT(*) FROM todos WHERE is_done = 0 AND archived = 0) AS open_todos,
+            (SELECT COUNT(*) FROM todos WHERE is_done = 1 AND archived = 0) AS completed_todos,
+            (SELECT COUNT(*) FROM questions WHERE is_resolved = 0 AND archived = 0) AS open_questions,
+            (SELECT COUNT(*) FROM embeddings) AS embeddings,
+            (SELECT COUNT(*) FROM documents WHERE archived = 1) AS archived_documents
+    ''',
+    True: '''
+        SELECT
+            (SELECT COUNT(*) FROM documents) AS documents,
+            (SELECT COUNT(*) FROM todos WHERE is_done = 0) AS open_todos,
+            (SELECT COUNT(*) FROM todos WHERE is_done = 1) AS completed_todos,
+            (SELECT COUNT(*) FROM questions WHERE is_resolved = 0) AS open_questions,
+            (SELECT COUNT(*) FROM embeddings) AS embeddings,
+            (SELECT COUNT(*) FROM documents WHERE archived = 1) AS archived_documents
+    ''',
+}
+
+
+def _new_hasher():
+    """Create a hasher for content change detection.
+
+    Uses xxh3 when the optional xxhash package is installed; the hash is only
+    a change detector, not a security boundary. Otherwise falls back to
+    SHA-256, which OpenSSL runs on the CPU's SHA extensions where available
+    and is faster than MD5 there.
+    """
+    if xxhash is not None:
+        return xxhash.xxh3_64()
+    return hashlib.sha256()
+
+
+def _hash_content(content: str) -> str:
+    """Hash document content for change detection."""
+    hasher = _new_hasher()
+    hasher.update(content.encode())
+    return hasher.hexdigest()
+
+
+def _read_document(path: Path) -> tuple[str, str]:
+    """Read a markdown file, hashing it as it streams in.
+
+    Returns (content, content_hash) where content_hash matches what
+    index_document would compute for the same content.
+    """
+    hasher = _new_hasher()
+    chunks = []
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            hasher.update(chunk)
+            chunks.append(chunk)
+    content = b''.join(chunks).decode('utf-8')
+    if '\r' not in content:
+        return content, hasher.hexdigest()
+
+    # Normalize newlines the way text-mode reads do, then hash what we index
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+    return content, _hash_content(content)
+
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _make_snippet(content: str) -> str:
+    """Build a search-result snippet from the start of a document, with whitespace collapsed."""
+    head = content[:SNIPPET_LENGTH * 4]
+    text = _WHITESPACE.sub(' ', head).strip()
+    snippet = text[:SNIPPET_LENGTH]
+    if len(text) > SNIPPET_LENGTH or content[len(head):].strip():
+        snippet += '...'
+    return snippet
+
+
+def _encode_embedding(embedding) -> bytes:
+    """Pack an embedding as raw float32 bytes for storage."""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def _decode_embedding(value) -> np.ndarray:
+    """Unpack a stored embedding (float32 BLOB, or JSON text from older databases)."""
+    if isinstance(value, str):
+        return np.array(json.loads(value), dtype=np.float32)
+    return np.frombuffer(value, dtype=np.float32)
+
+
+def _locked(method):
+    """Run an Indexer method while holding the index write lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _rows(rows: list, as_dict: bool) -> list:
+    """Convert fetched rows to dicts, or hand back the sqlite3.Row objects as-is.
+
+    Rows support lookup by column name, so callers that read a few columns
+    from large results can skip building a dict per row.
+    """
+    if as_dict:
+        return [dict(row) for row in rows]
+    return rows
+
+
+def _scan_markdown(directory: Path, prefix: str, archived: int) -> list:
+    """List (path, filename, archived, stat) for the markdown files in a directory.
+
+    os.scandir hands back each entry's stat with the listing, so every file
+    is stat'ed once.
+    """
+    with os.scandir(directory) as entries:
+        return [
+            (Path(entry.path), prefix + entry.name, archived, entry.stat())
+            for entry in entries
+            if entry.name.endswith('.md') and entry.is_file()
+        ]
+
+
+# Non-ASCII characters re.IGNORECASE treats as equal to letters in the
+# TODO/TASK/QUESTION markers (İ, ı, ſ, Kelvin sign); bytes.lower() can't see them
+_CASEFOLD_LOOKALIKES = ('\u0130', '\u0131', '\u017f', '\u212a')
+
+
+def _marker_lines(content: str, markers: tuple[bytes, ...]):
+    """Yield (line_number, line) for lines that may contain one of the markers.
+
+    Markers are lowercase ASCII and are located with bytes.find on an
+    ASCII-lowercased copy of the document, so regexes only run on the few
+    lines that can match instead of on every line.
+    """
+    if any(ch in content for ch in _CASEFOLD_LOOKALIKES):
+        # Let the regex engine fold case instead; still no per-line split
+        pattern = re.compile('|'.join(re.escape(m.decode()) for m in markers), re.IGNORECASE)
+        line_num = 1
+        counted = 0
+        match = pattern.search(content)
+        while match:
+            start = content.rfind('\n', 0, match.start()) + 1
+            end = content.find('\n', match.end())
+            if end == -1:
+                end = len(content)
+            line_num += content.count('\n', counted, start)
+            counted = start
+            yield line_num, content[start:end]
+            match = pattern.search(content, end)
+        return
+
+    raw = content.encode('utf-8', 'surrogatepass')
+    lowered = raw.lower()
+    spans = {}
+    for marker in markers:
+        pos = lowered.find(marker)
+        while pos != -1:
+            start = raw.rfind(b'\n', 0, pos) + 1
+            end = raw.find(b'\n', pos)
+            if end == -1:
+                end = len(raw)
+            spans[start] = end
+            pos = lowered.find(marker, end)
+
+    line_num = 1
+    counted = 0
+    for start in sorted(spans):
+        line_num += raw.count(b'\n', counted, start)
+        counted = start
+        yield line_num, raw[start:spans[start]].decode('utf-8', 'surrogatepass')
+
 
 class Indexer:
     """Manages the SQLite index for documents and TODOs."""
 
-    # Patterns for TODO detection
+    # Patterns for TODO detection, run on single candidate lines. Kept as
+    # separate patterns on purpose: fusing them into one alternation makes the
+    # engine try every branch at every offset, which measured 35-40% slower.
     TODO_PATTERN = re.compile(
-        r'^(.*?)\b(TODO|TASK)\b[:\s]*(.*)$',
-        re.IGNORECASE
+        r'^(.*?)\b(TODO|TASK)\b(?:[^\S\n]|:)*(.*)$',
+        re.IGNORECASE | re.MULTILINE
     )
     DONE_PATTERN = re.compile(r'\bDONE\b', re.IGNORECASE)
-    QUESTION_PATTERN = re.compile(r'\[QUESTION:\s*([^\]]+)\]', re.IGNORECASE)
+    QUESTION_PATTERN = re.compile(r'\[QUESTION:[^\S\n]*([^\]\n]+)\]', re.IGNORECASE)
+
+    # Bump when indexed data changes shape; older databases get one full rebuild
+    SCHEMA_VERSION = 2
 
     def __init__(self, db_path: Path, repo_path: Path, embedding_manager=None):
         self.db_path = Path(db_path)
         self.repo_path = Path(repo_path)
         self.embedding_manager = embedding_manager
         self.conn = None
+        # In-memory copy of all embeddings for semantic search. Writes update it
+        # in place (batched writes once they commit); a rollback marks it dirty.
+        self._emb_ids: list[Optional[str]] = []
+        self._emb_pos: dict[str, int] = {}
+        self._emb_matrix: Optional[np.ndarray] = None
+        self._emb_archived: Optional[np.ndarray] = None
+        self._emb_deleted: Optional[np.ndarray] = None
+        self._emb_dirty = True
+        # Approximate nearest-neighbour graph over _emb_matrix (hnswlib, large indexes only)
+        self._ann = None
+        # Serializes writes on the shared connection; a batch holds it until it commits
+        self._write_lock = threading.RLock()
+        # Set while rebuild_index holds one transaction open for the whole run
+        self._in_batch = False
+        # Embedding matrix updates made inside a batch, applied once it commits
+        self._emb_pending: list[tuple] = []
+        # Set while rebuild_index reloads emptied tables with secondary indexes dropped
+        self._bulk_loading = False
+        # Bumped on every write; cached stats are valid while it is unchanged
+        self._version = 0
+        self._stats_cache: dict[bool, tuple[int, dict]] = {}
         self._init_db()
 
     def _init_db(self):
         """Initialize the database schema."""
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
         self.conn.row_factory = sqlite3.Row
+        self._configure_connection()
 
         self.conn.executescript('''
             CREATE TABLE IF NOT EXISTS documents (
@@ -46,7 +386,10 @@ class Indexer:
                 created_at REAL,
                 modified_at REAL,
                 indexed_at REAL,
-                archived INTEGER DEFAULT 0
+                archived INTEGER DEFAULT 0,
+                snippet TEXT,
+                size INTEGER,
+                mtime REAL
             );
 
             CREATE TABLE IF NOT EXISTS todos (
@@ -57,6 +400,9 @@ class Indexer:
                 text TEXT NOT NULL,
                 is_done INTEGER DEFAULT 0,
                 created_at REAL,
+                document_title TEXT,
+                filename TEXT,
+                archived INTEGER DEFAULT 0,
                 FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
                 UNIQUE(document_id, line_number)
             );
@@ -68,109 +414,258 @@ class Indexer:
                 text TEXT NOT NULL,
                 is_resolved INTEGER DEFAULT 0,
                 created_at REAL,
+                document_title TEXT,
+                filename TEXT,
+                archived INTEGER DEFAULT 0,
                 FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
             );
 
             CREATE TABLE IF NOT EXISTS embeddings (
                 document_id TEXT PRIMARY KEY,
                 content_hash TEXT NOT NULL,
-                embedding TEXT NOT NULL,
+                input_hash TEXT,
+                embedding BLOB NOT NULL,
                 created_at REAL,
                 FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
             );
 
             CREATE INDEX IF NOT EXISTS idx_todos_document ON todos(document_id);
-            CREATE INDEX IF NOT EXISTS idx_todos_done ON todos(is_done);
             CREATE INDEX IF NOT EXISTS idx_questions_document ON questions(document_id);
             CREATE INDEX IF NOT EXISTS idx_embeddings_hash ON embeddings(content_hash);
         ''')
         self.conn.commit()
 
-        # Migration: Add archived column if it doesn't exist (for existing databases)
-        self._migrate_add_archived_column()
-
-        # Create index on archived column (after migration ensures column exists)
-        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_documents_archived ON documents(archived)')
+        # Migrations: Add columns that older databases don't have yet
+        self._migrate_add_column('documents', 'archived', 'INTEGER DEFAULT 0')
+        self._migrate_add_column('documents', 'snippet', 'TEXT')
+        self._migrate_add_column('documents', 'size', 'INTEGER')
+        self._migrate_add_column('documents', 'mtime', 'REAL')
+        self._migrate_add_column('embeddings', 'input_hash', 'TEXT')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_input ON embeddings(input_hash)')
+        # Document fields mirrored onto todos/questions so listing them needs no JOIN
+        for table in ('todos', 'questions'):
+            self._migrate_add_column(table, 'document_title', 'TEXT')
+            self._migrate_add_column(table, 'filename', 'TEXT')
+            self._migrate_add_column(table, 'archived', 'INTEGER DEFAULT 0')
+
+        # Indexes superseded by composites in _SECONDARY_INDEXES
+        self.conn.execute('DROP INDEX IF EXISTS idx_documents_archived')
+        self.conn.execute('DROP INDEX IF EXISTS idx_todos_done')
+        # Created after the migrations so every indexed column exists
+        self._create_secondary_indexes()
+
+        # Full-text index over document content (rowid mirrors documents.rowid)
+        self.conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                doc_id UNINDEXED, filename, title, content,
+                tokenize='porter unicode61'
+            )
+        ''')
         self.conn.commit()
 
-    def _migrate_add_archived_column(self):
-        """Add archived column to documents table if it doesn't exist."""
-        cursor = self.conn.execute("PRAGMA table_info(documents)")
+        user_version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        self._schema_outdated = user_version < self.SCHEMA_VERSION
+
+    def _create_secondary_indexes(self):
+        """Create any missing secondary indexes."""
+        for name, definition in _SECONDARY_INDEXES.items():
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+
+    def _drop_secondary_indexes(self):
+        """Drop the secondary indexes ahead of a bulk load."""
+        for name in _SECONDARY_INDEXES:
+            self.conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+    def _configure_connection(self):
+        """Tune the connection for a single-process, read-mostly index.
+
+        WAL lets searches read while a write is in progress and makes commits
+        cheaper; it keeps -wal and -shm files next to the database.
+        synchronous=NORMAL is safe with WAL (a crash can only lose the last
+        commits, and the index can be rebuilt from the repository anyway).
+        """
+        pragmas = (
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            'PRAGMA temp_store=MEMORY',
+            'PRAGMA mmap_size=268435456',
+            'PRAGMA cache_size=-65536',
+        )
+        for pragma in pragmas:
+            try:
+                self.conn.execute(pragma)
+            except sqlite3.DatabaseError as e:
+                # e.g. in-memory databases don't support WAL or mmap
+                print(f"Could not apply {pragma}: {e}")
+
+    def _migrate_add_column(self, table: str, column: str, definition: str):
+        """Add a column to a table if it doesn't exist (for existing databases)."""
+        cursor = self.conn.execute(f"PRAGMA table_info({table})")
         columns = [row[1] for row in cursor.fetchall()]
-        if 'archived' not in columns:
-            self.conn.execute('ALTER TABLE documents ADD COLUMN archived INTEGER DEFAULT 0')
+        if column not in columns:
+            self.conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            self.conn.commit()
+
+    def _commit(self):
+        """Commit pending writes, unless a batch will commit them when it finishes."""
+        if not self._in_batch:
             self.conn.commit()
 
+    @contextmanager
+    def _transaction(self):
+        """Apply a block of writes atomically (inside a batch, the batch owns the commit)."""
+        if self._in_batch:
+            yield
+        else:
+            with self.conn:
+                yield
+
+    @contextmanager
+    def _batch(self):
+        """Run many index updates in a single transaction with a single commit."""
+        with self._write_lock:
+            self._in_batch = True
+            self._emb_pending = []
+            try:
+                with self.conn:
+                    yield
+            except BaseException:
+                # Nothing was applied in memory, but reload rather than trust it
+                self._emb_dirty = True
+                raise
+            finally:
+                self._in_batch = False
+                pending, self._emb_pending = self._emb_pending, []
+            # Committed: apply the batch's embedding changes in the order they were made
+            for apply, args in pending:
+                apply(*args)
+
     def set_embedding_manager(self, embedding_manager):
         """Set the embedding manager after initialization."""
         self.embedding_manager = embedding_manager
 
+    @_locked
     def index_document(self, doc_id: str, filename: str, content: str,
                        created_at: float, modified_at: float,
-                       generate_embedding: bool = True) -> dict:
+                       generate_embedding: bool = True,
+                       content_hash: Optional[str] = None) -> dict:
         """Index a single document, extracting TODOs and questions."""
-        import hashlib
-        content_hash = hashlib.md5(content.encode()).hexdigest()
+        if content_hash is None:
+            content_hash = _hash_content(content)
 
         # Check if content has changed
         existing = self.conn.execute(
-            'SELECT content_hash FROM documents WHERE id = ?', (doc_id,)
+            'SELECT content_hash, archived FROM documents WHERE id = ?', (doc_id,)
         ).fetchone()
 
         if existing and existing['content_hash'] == content_hash:
-            # Content unchanged, skip re-indexing
-            return {'status': 'unchanged', 'doc_id': doc_id}
+            # Content unchanged, skip re-indexing (but fill in a missing embedding)
+            embedding_generated = False
+            if generate_embedding and self.embedding_manager and content.strip():
+                embedding_generated = self._update_embedding(doc_id, content, content_hash)
+            return {'status': 'unchanged', 'doc_id': doc_id, 'embedding_generated': embedding_generated}
+
+        archived = existing['archived'] if existing else 0
 
         # Extract title from first line
-        lines = content.split('\n')
-        title = lines[0].lstrip('#').strip() if lines else filename
+        title = content.partition('\n')[0].lstrip('#').strip()
 
-        # Update or insert document
-        now = datetime.now().timestamp()
-        self.conn.execute('''
-            INSERT INTO documents (id, filename, title, content_hash, created_at, modified_at, indexed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(id) DO UPDATE SET
-                filename = excluded.filename,
-                title = excluded.title,
-                content_hash = excluded.content_hash,
-                modified_at = excluded.modified_at,
-                indexed_at = excluded.indexed_at
-        ''', (doc_id, filename, title, content_hash, created_at, modified_at, now))
-
-        # Clear existing TODOs and questions for this document
-        self.conn.execute('DELETE FROM todos WHERE document_id = ?', (doc_id,))
-        self.conn.execute('DELETE FROM questions WHERE document_id = ?', (doc_id,))
+        # Store the search snippet so search results don't need to read the file
+        snippet = _make_snippet(content)
 
-        # Extract TODOs
-        todos_found = 0
-        for line_num, line in enumerate(lines, start=1):
+        # Extract TODOs and questions
+        # (only lines containing a marker reach the regexes)
+        todos = {}
+        for line_num, line in _marker_lines(content, (b'todo', b'task')):
             todo_match = self.TODO_PATTERN.search(line)
-            if todo_match:
-                is_done = 1 if self.DONE_PATTERN.search(line) else 0
-                prefix = todo_match.group(1).strip()
-                todo_type = todo_match.group(2).upper()
-                todo_text = todo_match.group(3).strip()
-
-                # Combine prefix context if meaningful
-                full_text = todo_text if not prefix or prefix in ['-', '*', '•'] else f"{prefix}: {todo_text}"
-                if not full_text:
-                    full_text = line.strip()
-
-                self.conn.execute('''
-                    INSERT INTO todos (document_id, line_number, todo_type, text, is_done, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (doc_id, line_num, todo_type, full_text, is_done, now))
-                todos_found += 1
-
-            # Extract questions
-            for q_match in self.QUESTION_PATTERN.finditer(line):
-                self.conn.execute('''
-                    INSERT INTO questions (document_id, line_number, text, created_at)
-                    VALUES (?, ?, ?, ?)
-                ''', (doc_id, line_num, q_match.group(1).strip(), now))
+            if not todo_match:
+                continue
+            is_done = 1 if self.DONE_PATTERN.search(line) else 0
+            prefix = todo_match.group(1).strip()
+            todo_type = todo_match.group(2).upper()
+            todo_text = todo_match.group(3).strip()
 
-        self.conn.commit()
+            # Combine prefix context if meaningful
+            full_text = todo_text if not prefix or prefix in ['-', '*', '•'] else f"{prefix}: {todo_text}"
+            if not full_text:
+                full_text = line.strip()
+
+            todos[line_num] = (todo_type, full_text, is_done)
+
+        questions = [
+            (line_num, q_match.group(1).strip())
+            for line_num, line in _marker_lines(content, (b'[question:',))
+            for q_match in self.QUESTION_PATTERN.finditer(line)
+        ]
+
+        # Write everything in one transaction; a failure part-way leaves the index untouched
+        now = datetime.now().timestamp()
+        with self._transaction():
+            # Update or insert document
+            self.conn.execute(
+                _UPSERT_DOC_SQL,
+                (doc_id, filename, title, content_hash, created_at, modified_at, now, snippet)
+            )
+
+            # Update full-text index
+            self.conn.execute(_UPSERT_FTS_SQL, (doc_id, filename, title, content, doc_id))
+
+            # A bulk load starts from empty tables, so a new document has no
+            # rows to update or diff against
+            has_rows = existing is not None or not self._bulk_loading
+
+            # Rows that survive the diff below still need the new title/filename
+            if has_rows:
+                for table in ('todos', 'questions'):
+                    self.conn.execute(f'''
+                        UPDATE {table} SET document_title = ?, filename = ?
+                        WHERE document_id = ? AND (document_title IS NOT ? OR filename IS NOT ?)
+                    ''', (title, filename, doc_id, title, filename))
+
+            # Only touch TODO rows that were added, removed or changed
+            existing_todos = {}
+            if has_rows:
+                existing_todos = {
+                    row['line_number']: (row['todo_type'], row['text'], row['is_done'])
+                    for row in self.conn.execute(
+                        'SELECT line_number, todo_type, text, is_done FROM todos WHERE document_id = ?', (doc_id,)
+                    )
+                }
+            stale_lines = [line_num for line_num, todo in existing_todos.items() if todos.get(line_num) != todo]
+            if stale_lines:
+                placeholders = ','.join('?' * len(stale_lines))
+                self.conn.execute(
+                    f'DELETE FROM todos WHERE document_id = ? AND line_number IN ({placeholders})',
+                    (doc_id, *stale_lines)
+                )
+            self.conn.executemany(_INSERT_TODO_SQL, [
+                (doc_id, line_num, todo_type, text, is_done, now, title, filename, archived)
+                for line_num, (todo_type, text, is_done) in todos.items()
+                if existing_todos.get(line_num) != (todo_type, text, is_done)
+            ])
+
+            # Same for questions, matched on (line_number, text); a line may hold several
+            existing_questions = {}
+            if has_rows:
+                for row in self.conn.execute(
+                    'SELECT id, line_number, text FROM questions WHERE document_id = ?', (doc_id,)
+                ):
+                    existing_questions.setdefault((row['line_number'], row['text']), []).append(row['id'])
+            new_questions = []
+            for question in questions:
+                if existing_questions.get(question):
+                    existing_questions[question].pop()
+                else:
+                    new_questions.append(question)
+            stale_ids = [row_id for row_ids in existing_questions.values() for row_id in row_ids]
+            if stale_ids:
+                placeholders = ','.join('?' * len(stale_ids))
+                self.conn.execute(f'DELETE FROM questions WHERE id IN ({placeholders})', stale_ids)
+            self.conn.executemany(_INSERT_QUESTION_SQL, [
+                (doc_id, line_num, text, now, title, filename, archived)
+                for line_num, text in new_questions
+            ])
+        self._version += 1
 
         # Generate embedding if manager is available
         embedding_generated = False
@@ -180,7 +675,7 @@ class Indexer:
         return {
             'status': 'indexed',
             'doc_id': doc_id,
-            'todos_found': todos_found,
+            'todos_found': len(todos),
             'embedding_generated': embedding_generated
         }
 
@@ -188,54 +683,96 @@ class Indexer:
         """Generate and store embedding for a document."""
         # Check if we already have an embedding for this content hash
         existing = self.conn.execute(
-            'SELECT content_hash FROM embeddings WHERE document_id = ?', (doc_id,)
+            'SELECT content_hash, input_hash FROM embeddings WHERE document_id = ?', (doc_id,)
         ).fetchone()
 
         if existing and existing['content_hash'] == content_hash:
             return False  # Embedding already exists for this content
 
+        # Only the cleaned, truncated text is embedded; if that didn't change, keep the vector
+        text = self.embedding_manager.prepare_text(content)
+        input_hash = _hash_content(text)
+        if existing and existing['input_hash'] == input_hash:
+            self.conn.execute(
+                'UPDATE embeddings SET content_hash = ? WHERE document_id = ?',
+                (content_hash, doc_id)
+            )
+            self._commit()
+            return False
+
+        # Another document may already have embedded the same text (copies, templates)
+        duplicate = self.conn.execute(
+            'SELECT embedding FROM embeddings WHERE input_hash = ? LIMIT 1', (input_hash,)
+        ).fetchone()
+
         try:
-            embedding = self.embedding_manager.get_embedding(content)
+            if duplicate:
+                blob = duplicate['embedding']
+                if isinstance(blob, str):
+                    blob = _encode_embedding(_decode_embedding(blob))
+            else:
+                blob = _encode_embedding(self.embedding_manager.get_embedding(text))
             now = datetime.now().timestamp()
 
-            self.conn.execute('''
-                INSERT INTO embeddings (document_id, content_hash, embedding, created_at)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(document_id) DO UPDATE SET
-                    content_hash = excluded.content_hash,
-                    embedding = excluded.embedding,
-                    created_at = excluded.created_at
-            ''', (doc_id, content_hash, json.dumps(embedding), now))
-            self.conn.commit()
+            self.conn.execute(
+                _UPSERT_EMBEDDING_SQL,
+                (doc_id, content_hash, input_hash, blob, now)
+            )
+            self._commit()
+            self._emb_upsert(doc_id, _decode_embedding(blob))
+            self._version += 1
             return True
         except Exception as e:
             print(f"Error generating embedding for {doc_id}: {e}")
             return False
 
+    @_locked
     def remove_document(self, doc_id: str):
         """Remove a document and its TODOs from the index."""
+        self.conn.execute(
+            'DELETE FROM documents_fts WHERE rowid = (SELECT rowid FROM documents WHERE id = ?)',
+            (doc_id,)
+        )
         self.conn.execute('DELETE FROM documents WHERE id = ?', (doc_id,))
         self.conn.execute('DELETE FROM embeddings WHERE document_id = ?', (doc_id,))
-        # TODOs and questions are cascade deleted
-        self.conn.commit()
+        # Foreign keys aren't enforced, so remove TODOs and questions explicitly
+        self.conn.execute('DELETE FROM todos WHERE document_id = ?', (doc_id,))
+        self.conn.execute('DELETE FROM questions WHERE document_id = ?', (doc_id,))
+        self._commit()
+        self._emb_remove(doc_id)
+        self._version += 1
 
+    @_locked
     def archive_document(self, doc_id: str, new_filename: str):
         """Mark a document as archived and update its filename."""
-        self.conn.execute(
-            'UPDATE documents SET archived = 1, filename = ? WHERE id = ?',
-            (new_filename, doc_id)
-        )
+        self._set_location(doc_id, new_filename, archived=1)
         self.conn.commit()
 
+    @_locked
     def unarchive_document(self, doc_id: str, new_filename: str):
         """Mark a document as not archived and update its filename."""
+        self._set_location(doc_id, new_filename, archived=0)
+        self.conn.commit()
+
+    def _set_location(self, doc_id: str, new_filename: str, archived: int):
+        """Update a document's filename and archived flag, including mirrored copies."""
         self.conn.execute(
-            'UPDATE documents SET archived = 0, filename = ? WHERE id = ?',
+            'UPDATE documents SET archived = ?, filename = ? WHERE id = ?',
+            (archived, new_filename, doc_id)
+        )
+        self.conn.execute(
+            'UPDATE documents_fts SET filename = ? WHERE rowid = (SELECT rowid FROM documents WHERE id = ?)',
             (new_filename, doc_id)
         )
-        self.conn.commit()
+        for table in ('todos', 'questions'):
+            self.conn.execute(
+                f'UPDATE {table} SET archived = ?, filename = ? WHERE document_id = ?',
+                (archived, new_filename, doc_id)
+            )
+        self._emb_set_archived(doc_id, archived)
+        self._version += 1
 
-    def get_archived_documents(self) -> list:
+    def get_archived_documents(self, as_dict: bool = True) -> list:
         """Get all archived documents."""
         rows = self.conn.execute('''
             SELECT id, filename, title, modified_at, created_at
@@ -243,33 +780,22 @@ class Indexer:
             WHERE archived = 1
             ORDER BY modified_at DESC
         ''').fetchall()
-        return [dict(row) for row in rows]
+        return _rows(rows, as_dict)
 
-    def get_all_todos(self, include_done: bool = False, include_archived: bool = False) -> list:
+    def get_all_todos(self, include_done: bool = False, include_archived: bool = False,
+                      as_dict: bool = True) -> list:
         """Get all TODOs across all documents."""
-        query = '''
-            SELECT t.*, d.title as document_title, d.filename
-            FROM todos t
-            JOIN documents d ON t.document_id = d.id
-            WHERE 1=1
-        '''
-        if not include_done:
-            query += ' AND t.is_done = 0'
-        if not include_archived:
-            query += ' AND d.archived = 0'
-        query += ' ORDER BY t.created_at DESC'
+        rows = self.conn.execute(_TODOS_SQL[(bool(include_done), bool(include_archived))]).fetchall()
+        return _rows(rows, as_dict)
 
-        rows = self.conn.execute(query).fetchall()
-        return [dict(row) for row in rows]
-
-    def get_todos_for_document(self, doc_id: str) -> list:
+    def get_todos_for_document(self, doc_id: str, as_dict: bool = True) -> list:
         """Get TODOs for a specific document."""
         rows = self.conn.execute('''
             SELECT * FROM todos WHERE document_id = ? ORDER BY line_number
         ''', (doc_id,)).fetchall()
-        return [dict(row) for row in rows]
+        return _rows(rows, as_dict)
 
-    def get_recent_completed_todos(self, hours: int = 24) -> list:
+    def get_recent_completed_todos(self, hours: int = 24, as_dict: bool = True) -> list:
         """Get TODOs marked as done from documents modified within the time window."""
         from datetime import timedelta
         cutoff = (datetime.now() - timedelta(hours=hours)).timestamp()
@@ -281,80 +807,35 @@ class Indexer:
             WHERE t.is_done = 1 AND d.modified_at >= ?
             ORDER BY d.modified_at DESC
         ''', (cutoff,)).fetchall()
-        return [dict(row) for row in rows]
+        return _rows(rows, as_dict)
 
-    def get_recent_documents(self, hours: int = 24, include_archived: bool = False) -> list:
+    def get_recent_documents(self, hours: int = 24, include_archived: bool = False,
+                             as_dict: bool = True) -> list:
         """Get documents modified within the time window."""
         from datetime import timedelta
         cutoff = (datetime.now() - timedelta(hours=hours)).timestamp()
 
-        query = '''
-            SELECT id, filename, title, modified_at
-            FROM documents
-            WHERE modified_at >= ?
-        '''
-        if not include_archived:
-            query += ' AND archived = 0'
-        query += ' ORDER BY modified_at DESC'
-
-        rows = self.conn.execute(query, (cutoff,)).fetchall()
-        return [dict(row) for row in rows]
+        rows = self.conn.execute(_RECENT_DOCUMENTS_SQL[bool(include_archived)], (cutoff,)).fetchall()
+        return _rows(rows, as_dict)
 
-    def get_all_questions(self, include_resolved: bool = False, include_archived: bool = False) -> list:
+    def get_all_questions(self, include_resolved: bool = False, include_archived: bool = False,
+                          as_dict: bool = True) -> list:
         """Get all unresolved questions."""
-        query = '''
-            SELECT q.*, d.title as document_title, d.filename
-            FROM questions q
-            JOIN documents d ON q.document_id = d.id
-            WHERE 1=1
-        '''
-        if not include_resolved:
-            query += ' AND q.is_resolved = 0'
-        if not include_archived:
-            query += ' AND d.archived = 0'
-        query += ' ORDER BY q.created_at DESC'
-
-        rows = self.conn.execute(query).fetchall()
-        return [dict(row) for row in rows]
+        rows = self.conn.execute(_QUESTIONS_SQL[(bool(include_resolved), bool(include_archived))]).fetchall()
+        return _rows(rows, as_dict)
 
     def get_document_stats(self, include_archived: bool = False) -> dict:
         """Get statistics about indexed documents."""
-        if include_archived:
-            doc_count = self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
-            todo_count = self.conn.execute('SELECT COUNT(*) FROM todos WHERE is_done = 0').fetchone()[0]
-            done_count = self.conn.execute('SELECT COUNT(*) FROM todos WHERE is_done = 1').fetchone()[0]
-            question_count = self.conn.execute('SELECT COUNT(*) FROM questions WHERE is_resolved = 0').fetchone()[0]
-        else:
-            doc_count = self.conn.execute('SELECT COUNT(*) FROM documents WHERE archived = 0').fetchone()[0]
-            todo_count = self.conn.execute('''
-                SELECT COUNT(*) FROM todos t
-                JOIN documents d ON t.document_id = d.id
-                WHERE t.is_done = 0 AND d.archived = 0
-            ''').fetchone()[0]
-            done_count = self.conn.execute('''
-                SELECT COUNT(*) FROM todos t
-                JOIN documents d ON t.document_id = d.id
-                WHERE t.is_done = 1 AND d.archived = 0
-            ''').fetchone()[0]
-            question_count = self.conn.execute('''
-                SELECT COUNT(*) FROM questions q
-                JOIN documents d ON q.document_id = d.id
-                WHERE q.is_resolved = 0 AND d.archived = 0
-            ''').fetchone()[0]
-
-        embedding_count = self.conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
-        archived_count = self.conn.execute('SELECT COUNT(*) FROM documents WHERE archived = 1').fetchone()[0]
-
-        return {
-            'documents': doc_count,
-            'open_todos': todo_count,
-            'completed_todos': done_count,
-            'open_questions': question_count,
-            'embeddings': embedding_count,
-            'archived_documents': archived_count,
-        }
-
-    def get_all_embeddings(self, include_archived: bool = False) -> list[tuple[str, list[float]]]:
+        include_archived = bool(include_archived)
+        cached = self._stats_cache.get(include_archived)
+        if cached is None or cached[0] != self._version:
+            version = self._version
+            row = self.conn.execute(_STATS_SQL[include_archived]).fetchone()
+            cached = (version, dict(row))
+            self._stats_cache[include_archived] = cached
+        return dict(cached[1])
+
+    def get_all_embeddings(self, include_archived: bool = False) -> list[tuple[str, np.ndarray]]:
         """Get all embeddings for search."""
         if include_archived:
             rows = self.conn.execute('''
@@ -366,48 +847,174 @@ class Indexer:
                 JOIN documents d ON e.document_id = d.id
                 WHERE d.archived = 0
             ''').fetchall()
-        return [(row['document_id'], json.loads(row['embedding'])) for row in rows]
+        return [(row['document_id'], _decode_embedding(row['embedding'])) for row in rows]
+
+    def _load_embedding_matrix(self):
+        """Reload the in-memory embedding matrix if the index changed since the last load."""
+        if not self._emb_dirty:
+            return
+
+        rows = self.conn.execute('''
+            SELECT e.document_id, e.embedding, d.archived FROM embeddings e
+            JOIN documents d ON e.document_id = d.id
+        ''').fetchall()
+        self._emb_ids = [row['document_id'] for row in rows]
+        self._emb_pos = {doc_id: i for i, doc_id in enumerate(self._emb_ids)}
+        if rows:
+            # Normalize rows once here so each search is a single dot product
+            matrix = np.stack([_decode_embedding(row['embedding']) for row in rows])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._emb_matrix = matrix / norms
+        else:
+            self._emb_matrix = np.empty((0, 0), dtype=np.float32)
+        self._emb_archived = np.array([bool(row['archived']) for row in rows], dtype=bool)
+        self._emb_deleted = np.zeros(len(rows), dtype=bool)
+        self._ann = None
+        self._emb_dirty = False
+
+    def _emb_upsert(self, doc_id: str, embedding: np.ndarray):
+        """Apply a newly stored embedding to the loaded matrix and ANN graph."""
+        if self._emb_dirty:
+            return
+        if self._in_batch:
+            # Bulk writes may still roll back; apply after the batch commits
+            self._emb_pending.append((self._emb_upsert, (doc_id, embedding)))
+            return
+        doc = self.conn.execute('SELECT archived FROM documents WHERE id = ?', (doc_id,)).fetchone()
+        if doc is None:
+            return
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+
+        row = self._emb_pos.get(doc_id)
+        if row is not None:
+            self._emb_matrix[row] = vector
+        else:
+            row = len(self._emb_ids)
+            if row == 0:
+                self._emb_matrix = vector[np.newaxis, :]
+            else:
+                self._emb_matrix = np.vstack([self._emb_matrix, vector])
+            self._emb_ids.append(doc_id)
+            self._emb_pos[doc_id] = row
+            self._emb_archived = np.append(self._emb_archived, bool(doc['archived']))
+            self._emb_deleted = np.append(self._emb_deleted, False)
+
+        if self._ann is not None:
+            capacity = self._ann.get_max_elements()
+            if row >= capacity:
+                self._ann.resize_index(max(2 * capacity, row + 1))
+            # Adding an existing label replaces its vector
+            self._ann.add_items(vector[np.newaxis, :], [row])
+
+    def _emb_remove(self, doc_id: str):
+        """Drop a removed document from the loaded matrix and ANN graph."""
+        if self._emb_dirty:
+            return
+        if self._in_batch:
+            self._emb_pending.append((self._emb_remove, (doc_id,)))
+            return
+        row = self._emb_pos.pop(doc_id, None)
+        if row is None:
+            return
+
+        # Leave a tombstone so the row numbers used as ANN labels stay valid
+        self._emb_ids[row] = None
+        self._emb_deleted[row] = True
+        if self._ann is not None:
+            self._ann.mark_deleted(row)
+        if self._emb_deleted.sum() > EMB_TOMBSTONE_LIMIT * len(self._emb_ids):
+            self._emb_dirty = True
+
+    def _emb_set_archived(self, doc_id: str, archived: int):
+        """Flip a document's archived flag in the loaded matrix."""
+        if self._emb_dirty:
+            return
+        if self._in_batch:
+            self._emb_pending.append((self._emb_set_archived, (doc_id, archived)))
+            return
+        row = self._emb_pos.get(doc_id)
+        if row is not None:
+            self._emb_archived[row] = bool(archived)
+
+    def _ann_search(self, query: str, top_k: int, include_archived: bool) -> list[tuple[str, float]]:
+        """Find nearest documents through the hnswlib graph, building it on first use."""
+        n, dim = self._emb_matrix.shape
+        if self._ann is None:
+            ann = hnswlib.Index(space='cosine', dim=dim)
+            ann.init_index(max_elements=n, M=16, ef_construction=200)
+            ann.add_items(self._emb_matrix, np.arange(n))
+            for row in np.flatnonzero(self._emb_deleted):
+                ann.mark_deleted(int(row))
+            self._ann = ann
+
+        archived = self._emb_archived
+        live = ~self._emb_deleted
+        candidates = int(live.sum() if include_archived else (live & ~archived).sum())
+        k = min(top_k, candidates)
+        if k == 0:
+            return []
+        # ef bounds the search breadth and must be at least k
+        self._ann.set_ef(max(k, 64))
+        label_filter = None if include_archived else (lambda label: not archived[label])
+
+        query_embedding = self.embedding_manager.get_query_embedding(query)
+        labels, distances = self._ann.knn_query(query_embedding, k=k, filter=label_filter)
+
+        results = []
+        for label, distance in zip(labels[0], distances[0]):
+            similarity = 1.0 - float(distance)
+            if similarity >= MIN_SEMANTIC_SIMILARITY:
+                results.append((self._emb_ids[label], similarity))
+        return results
 
     def semantic_search(self, query: str, limit: int = 10, include_archived: bool = False) -> list:
         """Perform semantic search using embeddings with exact match boosting."""
         if not self.embedding_manager:
             return []
 
-        embeddings = self.get_all_embeddings(include_archived=include_archived)
-        if not embeddings:
-            return []
+        self._load_embedding_matrix()
 
         # Get search results (request more than limit to allow for re-ranking)
-        results = self.embedding_manager.search(query, embeddings, top_k=limit * 2)
+        if hnswlib is not None and len(self._emb_pos) >= ANN_MIN_DOCUMENTS:
+            results = self._ann_search(query, limit * 2, include_archived)
+        else:
+            keep = ~self._emb_deleted
+            if not include_archived:
+                keep &= ~self._emb_archived
+            if not keep.any():
+                return []
+            results = self.embedding_manager.search_matrix(
+                query, self._emb_ids, self._emb_matrix, top_k=limit * 2, normalized=True,
+                mask=None if keep.all() else keep
+            )
+        if not results:
+            return []
 
         # Prepare query terms for exact match boosting (lowercase, split by spaces)
         query_terms = [term.lower() for term in query.split() if len(term) > 2]
 
-        # Fetch document details and apply exact match boosting
+        # Fetch document details for all results in a single query
+        doc_ids = [doc_id for doc_id, _ in results]
+        placeholders = ','.join('?' * len(doc_ids))
+        rows = self.conn.execute(f'''
+            SELECT d.id, d.filename, d.title, d.modified_at, d.archived, d.snippet, f.content
+            FROM documents d
+            LEFT JOIN documents_fts f ON f.rowid = d.rowid
+            WHERE d.id IN ({placeholders})
+        ''', doc_ids).fetchall()
+        docs = {row['id']: dict(row) for row in rows}
+
         search_results = []
         for doc_id, score in results:
-            doc = self.conn.execute('''
-                SELECT id, filename, title, modified_at, archived FROM documents WHERE id = ?
-            ''', (doc_id,)).fetchone()
-            if doc:
-                result = dict(doc)
-                # Get content for snippet and exact match check
-                if result.get('archived'):
-                    filepath = self.repo_path / 'archive' / f"{doc_id}.md"
-                else:
-                    filepath = self.repo_path / f"{doc_id}.md"
-
-                content = ""
-                if filepath.exists():
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        # Get first 200 chars as snippet
-                        result['snippet'] = content[:200].replace('\n', ' ').strip()
-                        if len(content) > 200:
-                            result['snippet'] += '...'
-
+            result = docs.get(doc_id)
+            if result:
                 # Apply exact match boosting
-                content_lower = content.lower()
+                content_lower = (result.pop('content') or '').lower()
                 title_lower = (result.get('title') or '').lower()
                 boost = 0.0
 
@@ -433,69 +1040,106 @@ class Indexer:
 
         return search_results[:limit]
 
+    @_locked
     def rebuild_index(self, generate_embeddings: bool = True) -> dict:
-        """Rebuild the entire index from the repository."""
+        """Bring the index in line with the repository.
+
+        Files whose size and mtime match the index are not read again, and
+        documents whose files are gone are removed.
+        """
         if not self.repo_path.exists():
             return {'status': 'error', 'message': 'Repository path does not exist'}
 
-        # Clear all data
-        self.conn.execute('DELETE FROM todos')
-        self.conn.execute('DELETE FROM questions')
-        self.conn.execute('DELETE FROM embeddings')
-        self.conn.execute('DELETE FROM documents')
-        self.conn.commit()
+        if self._schema_outdated:
+            # Clear all data so everything is re-indexed in the current format
+            self.conn.execute('DELETE FROM todos')
+            self.conn.execute('DELETE FROM questions')
+            self.conn.execute('DELETE FROM embeddings')
+            self.conn.execute('DELETE FROM documents')
+            self.conn.execute('DELETE FROM documents_fts')
+            self.conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+            self.conn.commit()
+            self._schema_outdated = False
+            self._emb_dirty = True
+            self._version += 1
+
+        # Loading into an empty index (first run, deleted or wiped database)
+        bulk_load = self.conn.execute('SELECT 1 FROM documents LIMIT 1').fetchone() is None
 
         indexed = 0
-        total_todos = 0
         embeddings_generated = 0
         archived_count = 0
+        seen = set()
 
-        # Index main documents
-        for md_file in self.repo_path.glob('*.md'):
-            stat = md_file.stat()
-            with open(md_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            result = self.index_document(
-                doc_id=md_file.stem,
-                filename=md_file.name,
-                content=content,
-                created_at=stat.st_ctime,
-                modified_at=stat.st_mtime,
-                generate_embedding=generate_embeddings
-            )
-            indexed += 1
-            total_todos += result.get('todos_found', 0)
-            if result.get('embedding_generated'):
-                embeddings_generated += 1
-
-        # Index archived documents
+        # Main documents, then archived documents
+        files = _scan_markdown(self.repo_path, '', 0)
         archive_path = self.repo_path / 'archive'
-        if archive_path.exists():
-            for md_file in archive_path.glob('*.md'):
-                stat = md_file.stat()
-                with open(md_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                result = self.index_document(
-                    doc_id=md_file.stem,
-                    filename=f'archive/{md_file.name}',
-                    content=content,
-                    created_at=stat.st_ctime,
-                    modified_at=stat.st_mtime,
-                    generate_embedding=generate_embeddings
-                )
-                # Mark as archived
-                self.conn.execute(
-                    'UPDATE documents SET archived = 1 WHERE id = ?',
-                    (md_file.stem,)
-                )
-                self.conn.commit()
-                indexed += 1
-                archived_count += 1
-                total_todos += result.get('todos_found', 0)
-                if result.get('embedding_generated'):
-                    embeddings_generated += 1
+        if archive_path.is_dir():
+            files += _scan_markdown(archive_path, 'archive/', 1)
+
+        # Read files that will need indexing on a thread pool, so disk reads
+        # overlap with indexing (the connection itself stays on this thread)
+        known = {
+            row['id']: row for row in self.conn.execute('''
+                SELECT d.id, d.size, d.mtime, d.content_hash, e.content_hash AS embedding_hash
+                FROM documents d
+                LEFT JOIN embeddings e ON e.document_id = d.id
+            ''')
+        }
+        to_read = [
+            md_file for md_file, _, _, stat in files
+            if self._needs_read(known.get(md_file.stem), stat, generate_embeddings)
+        ]
+
+        # One transaction and one commit for the whole run
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool, self._batch():
+            if bulk_load:
+                # Insert without per-row index upkeep and build each index once
+                # at the end; dropping inside the transaction means a failed run
+                # rolls the indexes back too. Rows without a document are orphans.
+                self.conn.execute('DELETE FROM todos')
+                self.conn.execute('DELETE FROM questions')
+                self._drop_secondary_indexes()
+                self._bulk_loading = True
+
+            try:
+                # to_read follows the order of files, so each read consumed
+                # frees a slot for the next one
+                upcoming = iter(to_read)
+                reads = {
+                    md_file: pool.submit(_read_document, md_file)
+                    for md_file in islice(upcoming, READ_AHEAD)
+                }
+                for md_file, filename, archived, stat in files:
+                    read = reads.pop(md_file, None)
+                    if read is not None:
+                        for next_file in islice(upcoming, 1):
+                            reads[next_file] = pool.submit(_read_document, next_file)
+                    result = self._index_file(
+                        md_file, filename, archived, stat, generate_embeddings,
+                        document=read.result() if read else None
+                    )
+                    seen.add(md_file.stem)
+                    indexed += 1
+                    if archived:
+                        archived_count += 1
+                    if result.get('embedding_generated'):
+                        embeddings_generated += 1
+            finally:
+                self._bulk_loading = False
+
+            if bulk_load:
+                self._create_secondary_indexes()
+
+            # Remove documents that no longer exist in the repository
+            for row in self.conn.execute('SELECT id FROM documents').fetchall():
+                if row['id'] not in seen:
+                    self.remove_document(row['id'])
+
+            # Refresh planner statistics so the composite indexes get picked
+            self.conn.execute('ANALYZE')
+
+        total_todos = self.conn.execute('SELECT COUNT(*) FROM todos').fetchone()[0]
 
         return {
             'status': 'success',
@@ -505,32 +1149,84 @@ class Indexer:
             'embeddings_generated': embeddings_generated,
         }
 
+    def _needs_read(self, existing, stat: os.stat_result, generate_embedding: bool) -> bool:
+        """Whether a file must be read: it changed on disk, or its embedding is missing or stale."""
+        stat_unchanged = (
+            existing is not None
+            and existing['size'] == stat.st_size
+            and existing['mtime'] == stat.st_mtime
+        )
+        needs_embedding = (
+            generate_embedding and self.embedding_manager is not None
+            and (existing is None or existing['embedding_hash'] != existing['content_hash'])
+        )
+        return not stat_unchanged or needs_embedding
+
+    def _index_file(self, md_file: Path, filename: str, archived: int, stat: os.stat_result,
+                    generate_embedding: bool, document: Optional[tuple[str, str]] = None) -> dict:
+        """Index a repository file, skipping the read when its size and mtime are unchanged.
+
+        document is the (content, content_hash) pair if the file was already read.
+        """
+        doc_id = md_file.stem
+        existing = self.conn.execute('''
+            SELECT d.filename, d.archived, d.size, d.mtime, d.content_hash,
+                   e.content_hash AS embedding_hash
+            FROM documents d
+            LEFT JOIN embeddings e ON e.document_id = d.id
+            WHERE d.id = ?
+        ''', (doc_id,)).fetchone()
+
+        if not self._needs_read(existing, stat, generate_embedding):
+            result = {'status': 'unchanged', 'doc_id': doc_id}
+        else:
+            content, content_hash = document or _read_document(md_file)
+            result = self.index_document(
+                doc_id=doc_id,
+                filename=filename,
+                content=content,
+                created_at=stat.st_ctime,
+                modified_at=stat.st_mtime,
+                generate_embedding=generate_embedding,
+                content_hash=content_hash
+            )
+            self.conn.execute(
+                'UPDATE documents SET size = ?, mtime = ? WHERE id = ?',
+                (stat.st_size, stat.st_mtime, doc_id)
+            )
+
+        # New documents are indexed under this filename as not archived
+        if existing is None:
+            moved = bool(archived)
+        else:
+            moved = existing['filename'] != filename or existing['archived'] != archived
+        if moved:
+            self._set_location(doc_id, filename, archived)
+        self._commit()
+        return result
+
     def llm_search(self, query: str, llm_provider, limit: int = 10, include_archived: bool = False) -> list:
         """Search documents by passing all content to an LLM with a large context window."""
+        # Document content comes from the full-text index rather than the files
         base_query = '''
-            SELECT id, filename, title, modified_at, archived
-            FROM documents
+            SELECT d.id, d.filename, d.title, d.modified_at, d.archived, f.content
+            FROM documents d
+            JOIN documents_fts f ON f.rowid = d.rowid
         '''
         if not include_archived:
-            base_query += ' WHERE archived = 0'
+            base_query += ' WHERE d.archived = 0'
         rows = self.conn.execute(base_query).fetchall()
 
         if not rows:
             return []
 
+        docs = {}
         corpus_parts = []
         for row in rows:
             doc = dict(row)
             doc_id = doc['id']
-            filepath = (
-                self.repo_path / 'archive' / f"{doc_id}.md"
-                if doc.get('archived')
-                else self.repo_path / f"{doc_id}.md"
-            )
-            if not filepath.exists():
-                continue
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = doc.pop('content')
+            docs[doc_id] = doc
             corpus_parts.append(f"[DOC_ID: {doc_id}]\nTitle: {doc.get('title', doc_id)}\n{content}")
 
         corpus = "\n\n---\n\n".join(corpus_parts)
@@ -573,10 +1269,7 @@ class Indexer:
             doc_id = item.get('doc_id')
             if not doc_id:
                 continue
-            doc = self.conn.execute(
-                'SELECT id, filename, title, modified_at, archived FROM documents WHERE id = ?',
-                (doc_id,)
-            ).fetchone()
+            doc = docs.get(doc_id)
             if doc:
                 result = dict(doc)
                 result['score'] = float(item.get('relevance_score', 0.5))
@@ -597,36 +1290,27 @@ class Indexer:
         return self._text_search(query, limit, include_archived)
 
     def _text_search(self, query: str, limit: int = 20, include_archived: bool = False) -> list:
-        """Fallback text search that searches actual document content."""
-        # Get all documents
-        base_query = '''
-            SELECT id, filename, title, modified_at, archived
-            FROM documents
-        '''
-        if not include_archived:
-            base_query += ' WHERE archived = 0'
-
-        rows = self.conn.execute(base_query).fetchall()
-
+        """Fallback text search over document content using the FTS5 index."""
         query_lower = query.lower()
         query_terms = [term for term in query_lower.split() if len(term) > 2]
 
+        # Match any term as a prefix; quoting keeps FTS5 query syntax out of user input
+        match_terms = query_terms or query_lower.split()
+        if not match_terms:
+            return []
+        match_query = ' OR '.join('"{}"*'.format(term.replace('"', '""')) for term in match_terms)
+
+        try:
+            rows = self.conn.execute(
+                _TEXT_SEARCH_SQL[bool(include_archived)], (match_query, limit * 2)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return []
+
         results = []
         for row in rows:
             doc = dict(row)
-            doc_id = doc['id']
-
-            # Get file path
-            if doc.get('archived'):
-                filepath = self.repo_path / 'archive' / f"{doc_id}.md"
-            else:
-                filepath = self.repo_path / f"{doc_id}.md"
-
-            if not filepath.exists():
-                continue
-
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = doc.pop('content') or ''
 
             content_lower = content.lower()
             title_lower = (doc.get('title') or '').lower()
@@ -665,9 +1349,7 @@ class Indexer:
                         snippet += '...'
                     doc['snippet'] = snippet
                 else:
-                    doc['snippet'] = content[:200].replace('\n', ' ').strip()
-                    if len(content) > 200:
-                        doc['snippet'] += '...'
+                    doc['snippet'] = _make_snippet(content)
                 results.append(doc)
 
         # Sort by score descending
@@ -8,9 +8,22 @@ Supports multiple providers: OpenRouter (default), Anthropic (future).
 import os
 import json
 import httpx
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from abc import ABC, abstractmethod
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _decode_response(response: httpx.Response):
+    """Decode a JSON response body, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
 
 class LLMProvider(ABC):
     """Base class for LLM providers."""
@@ -18,6 +31,23 @@ class LLMProvider(ABC):
     def __init__(self, model: str, api_key: str):
         self.model = model
         self.api_key = api_key
+        # One client per provider so back-to-back calls reuse pooled connections
+        # instead of paying a TCP and TLS handshake each time
+        self._client = httpx.Client(
+            timeout=120.0,
+            limits=httpx.Limits(max_keepalive_connections=8),
+        )
+
+    def close(self):
+        """Close the provider's pooled HTTP connections."""
+        self._client.close()
+
+    def __del__(self):
+        # A replaced provider is dropped rather than closed, since other
+        # threads may still be mid-request; it closes once the last one ends
+        client = getattr(self, '_client', None)
+        if client is not None:
+            client.close()
 
     @abstractmethod
     def complete(self, prompt: str, system: Optional[str] = None, max_tokens: int = 4096) -> str:
@@ -58,16 +88,15 @@ class OpenRouterProvider(LLMProvider):
         }
 
         try:
-            with httpx.Client(timeout=120.0) as client:
-                response = client.post(self.BASE_URL, headers=headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
+            response = self._client.post(self.BASE_URL, headers=headers, json=payload)
+            response.raise_for_status()
+            data = _decode_response(response)
 
-                # Extract the response content
-                if "choices" in data and len(data["choices"]) > 0:
-                    return data["choices"][0]["message"]["content"]
-                else:
-                    raise ValueError(f"Unexpected response format: {data}")
+            # Extract the response content
+            if "choices" in data and len(data["choices"]) > 0:
+                return data["choices"][0]["message"]["content"]
+            else:
+                raise ValueError(f"Unexpected response format: {data}")
 
         except httpx.HTTPStatusError as e:
             raise RuntimeError(f"OpenRouter API error: {e.response.status_code} - {e.response.text}")
@@ -101,16 +130,15 @@ class AnthropicProvider(LLMProvider):
             payload["system"] = system
 
         try:
-            with httpx.Client(timeout=120.0) as client:
-                response = client.post(self.BASE_URL, headers=headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
+            response = self._client.post(self.BASE_URL, headers=headers, json=payload)
+            response.raise_for_status()
+            data = _decode_response(response)
 
-                # Extract the response content
-                if "content" in data and len(data["content"]) > 0:
-                    return data["content"][0]["text"]
-                else:
-                    raise ValueError(f"Unexpected response format: {data}")
+            # Extract the response content
+            if "content" in data and len(data["content"]) > 0:
+                return data["content"][0]["text"]
+            else:
+                raise ValueError(f"Unexpected response format: {data}")
 
         except httpx.HTTPStatusError as e:
             raise RuntimeError(f"Anthropic API error: {e.response.status_code} - {e.response.text}")
@@ -164,6 +192,34 @@ class LLMManager:
             raise RuntimeError("No LLM provider configured")
         return self.provider.complete(prompt, system, max_tokens)
 
+    def batch_complete(self, prompts: list[str], system: Optional[str] = None,
+                       max_tokens: int = 4096, max_concurrency: int = 8) -> list[str]:
+        """
+        Generate completions for several prompts concurrently.
+
+        Requests share the provider's pooled client, with at most
+        max_concurrency in flight at once.
+
+        Returns:
+            Completions in the same order as prompts
+        """
+        if not self.provider:
+            raise RuntimeError("No LLM provider configured")
+        if not prompts:
+            return []
+
+        workers = min(max_concurrency, len(prompts))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(
+                lambda prompt: self.provider.complete(prompt, system, max_tokens),
+                prompts
+            ))
+
+    def close(self):
+        """Close the provider's HTTP connections."""
+        if self.provider:
+            self.provider.close()
+
     @property
     def model(self) -> str:
         """Get the current model name."""
@@ -5,134 +5,584 @@ Instead of committing on every save, this tracks files that need to be committed
 and batches them together after a configurable delay.
 """
 
+import math
+import os
+import queue
+import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional
 from pathlib import Path
 
+from git.exc import GitCommandError
+
+
+# Default quiet period: a batch is committed once no file has been marked for
+# this long, even before the debounce window (the maximum wait) runs out
+QUIET_SECONDS = 30
+
+# Above this many files, stage with one `git update-index` process instead of
+# GitPython's pure-Python index code. Either way blobs are never read whole:
+# GitPython streams each file into the object DB in fixed-size chunks, and
+# update-index hashes inside git itself.
+UPDATE_INDEX_THRESHOLD = 20
+
+
+def _stage_files(git_ops, files: list):
+    """
+    Stage files in the repository's index, writing the index once.
+
+    Returns the IndexFile holding the staged entries. Commit through it rather
+    than a fresh repo.index, which would parse .git/index from disk again.
+    """
+    if len(files) <= UPDATE_INDEX_THRESHOLD:
+        index = git_ops.repo.index
+        index.add(files)
+        return index
+
+    # NUL-delimited paths on stdin; --remove also stages files deleted since
+    subprocess.run(
+        ['git', 'update-index', '--add', '--remove', '-z', '--stdin'],
+        cwd=git_ops.repo.working_tree_dir,
+        input=b''.join(f.encode() + b'\0' for f in files),
+        capture_output=True,
+        check=True,
+    )
+    return git_ops.repo.index
+
+
+def enable_status_caches(git_ops) -> None:
+    """
+    Turn on git's untracked cache and, where supported, the builtin fsmonitor.
+
+    Both let git skip re-stat'ing the worktree when checking for changes. Only
+    settings the user has not configured are written. The fsmonitor daemon is
+    only built on macOS and Windows, so it is enabled only when the local git
+    advertises it.
+    """
+    if not git_ops.repo:
+        return
+
+    try:
+        reader = git_ops.repo.config_reader('repository')
+        settings = {}
+        if not reader.has_option('core', 'untrackedCache'):
+            settings['untrackedCache'] = 'true'
+        if not reader.has_option('core', 'fsmonitor'):
+            build = git_ops.repo.git.version('--build-options')
+            if 'fsmonitor--daemon' in build:
+                settings['fsmonitor'] = 'true'
+        if not settings:
+            return
+
+        with git_ops.repo.config_writer('repository') as writer:
+            for key, value in settings.items():
+                writer.set_value('core', key, value)
+    except Exception as e:
+        print(f"Error enabling git status caches: {e}")
+
+
+# A commit that fails because another git process holds .git/index.lock is
+# retried this many times, backing off exponentially from INDEX_LOCK_BACKOFF
+INDEX_LOCK_RETRIES = 3
+INDEX_LOCK_BACKOFF = 0.1
+
+# Errors a commit is expected to hit: git failures and unreadable/missing files
+COMMIT_ERRORS = (GitCommandError, subprocess.CalledProcessError, OSError)
+
+
+def _is_index_lock_error(error: Exception) -> bool:
+    """Whether a commit failed because .git/index.lock was held."""
+    stderr = getattr(error, 'stderr', None) or b''
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode(errors='replace')
+    return 'index.lock' in str(error) or 'index.lock' in stderr
+
+
+# Commit message templates: (single file, several files)
+UPDATE_MESSAGES = ("Update: {}", "Update {} documents")
+STARTUP_MESSAGES = ("Commit on startup: {}", "Commit on startup: {} documents")
+
+
+def _existing_files(git_ops, files) -> tuple:
+    """
+    Drop files that no longer exist in the working tree.
+
+    A pending file can be deleted or archived before its batch is committed;
+    those handlers commit the removal themselves.
+    """
+    root = git_ops.repo.working_tree_dir
+    return tuple(name for name in files if os.path.lexists(os.path.join(root, name)))
+
+
+def _commit_message(files, templates=UPDATE_MESSAGES) -> str:
+    """Build the commit message for a batch of files."""
+    single, several = templates
+    if len(files) == 1:
+        return single.format(files[0])
+    return several.format(len(files))
+
+
+# Pathspec for .md files in the repo root only; with glob magic '*' does not
+# match '/', so archive/ is excluded by git itself
+ROOT_MARKDOWN = ':(glob)*.md'
+
+
+# Append-only log of files marked pending, kept inside .git so it is never
+# committed. It only exists while there are uncommitted pending files.
+PENDING_LOG_NAME = 'braindump-pending'
+
+
+def pending_log_path(repo_path: Path) -> Path:
+    """Path of the pending-files log for a notes repository."""
+    return Path(repo_path) / '.git' / PENDING_LOG_NAME
+
+
+# Written on a clean shutdown with nothing pending; holds a fingerprint of the
+# index and the root notes so the next startup can skip the git scans
+CLEAN_MARKER_NAME = 'braindump-clean'
+
+
+def _worktree_fingerprint(repo_path: Path) -> str:
+    """
+    Cheap stat-only fingerprint of the index and the root .md files.
+
+    Covers the index mtime plus the count and newest mtime of the notes, so
+    notes added, removed or edited outside the server change it.
+    """
+    index_mtime = os.stat(Path(repo_path) / '.git' / 'index').st_mtime_ns
+    count = 0
+    newest = 0
+    with os.scandir(repo_path) as entries:
+        for entry in entries:
+            if entry.name.endswith('.md') and entry.is_file():
+                count += 1
+                newest = max(newest, entry.stat().st_mtime_ns)
+    return f"{index_mtime} {count} {newest}"
+
+
+def mark_clean_shutdown(repo_path: Path) -> None:
+    """Record that the server stopped with every note committed."""
+    # A surviving pending log means some process still had uncommitted files
+    if pending_log_path(repo_path).exists():
+        return
+    try:
+        marker = Path(repo_path) / '.git' / CLEAN_MARKER_NAME
+        marker.write_text(_worktree_fingerprint(repo_path))
+    except OSError as e:
+        print(f"Error recording clean shutdown: {e}")
+
+
+def _clean_since_shutdown(repo_path: Path) -> bool:
+    """Consume the clean-shutdown marker; True if nothing changed since."""
+    marker = Path(repo_path) / '.git' / CLEAN_MARKER_NAME
+    try:
+        recorded = marker.read_text()
+    except FileNotFoundError:
+        return False
+    # Removed up front so a crash during this run falls back to scanning
+    marker.unlink()
+    return recorded == _worktree_fingerprint(repo_path)
+
+
+def _read_pending_log(log_path: Path) -> Optional[list]:
+    """Read the logged filenames, deduplicated, or None if there is no log."""
+    try:
+        lines = log_path.read_text().splitlines()
+    except FileNotFoundError:
+        return None
+    return list(dict.fromkeys(line for line in lines if line))
+
+
+def _write_pending_log(log_path: Path, files) -> None:
+    """Atomically replace the log with the given files, removing it if empty."""
+    if not files:
+        log_path.unlink(missing_ok=True)
+        return
+
+    tmp_path = log_path.with_name(log_path.name + '.tmp')
+    tmp_path.write_text(''.join(f"{name}\n" for name in files))
+    os.replace(tmp_path, log_path)
+
+
+def _changed_root_markdown(repo_path: Path, pathspecs=(ROOT_MARKDOWN,)) -> list:
+    """List tracked .md files in the repo root whose content has changed."""
+    # Refresh stat info first so diff-files does not report files that were
+    # merely touched
+    subprocess.run(
+        ['git', 'update-index', '-q', '--refresh'],
+        cwd=repo_path,
+        capture_output=True,
+    )
+    result = subprocess.run(
+        ['git', 'diff-files', '--name-only', '-z', '--', *pathspecs],
+        cwd=repo_path,
+        capture_output=True,
+        check=True,
+    )
+    return [name.decode() for name in result.stdout.split(b'\0') if name]
+
+
+def _untracked_root_markdown(repo_path: Path, pathspecs=(ROOT_MARKDOWN,)) -> list:
+    """
+    List untracked, non-ignored .md files in the repo root.
+
+    The pathspec keeps git from walking subdirectories for untracked files,
+    which is slow on large repos.
+    """
+    result = subprocess.run(
+        ['git', 'ls-files', '--others', '--exclude-standard', '-z', '--', *pathspecs],
+        cwd=repo_path,
+        capture_output=True,
+        check=True,
+    )
+    return [name.decode() for name in result.stdout.split(b'\0') if name]
+
 
 class PendingCommitManager:
     """Manages pending git commits with debouncing."""
 
-    def __init__(self, debounce_minutes: int = 5):
+    def __init__(self, debounce_minutes: int = 5, quiet_seconds: int = QUIET_SECONDS,
+                 log_path: Optional[Path] = None):
         """
         Initialize the pending commit manager.
 
         Args:
-            debounce_minutes: Minimum minutes since last change before committing.
+            debounce_minutes: Maximum minutes a change waits before committing.
+            quiet_seconds: Commit early once no file has changed for this long.
+            log_path: Optional file recording pending files across restarts.
         """
-        self.debounce_minutes = debounce_minutes
-        # Maps filename -> timestamp of first pending change
+        # Held by writers only. Readers use the tuple snapshot and the single
+        # float deadline, which are swapped in whole, so they never lock.
+        self._lock = threading.Lock()
+        # Maps filename -> time.monotonic() of first pending change. Re-marks
+        # never move an entry, so insertion order is also timestamp order and
+        # the first entry is always the oldest.
         self._pending: Dict[str, float] = {}
+        # Snapshot of the pending filenames, rebuilt only after the set changes
+        self._files: Optional[tuple] = None
+        # Earliest timestamp in _pending, and when it becomes due; kept up to
+        # date so polling is a single comparison
+        self._oldest_ts: Optional[float] = None
+        # Latest mark_pending call, including re-marks of already pending files
+        self._newest_ts: Optional[float] = None
+        # math.inf while nothing is pending, so polling never needs a None check
+        self._flush_at: float = math.inf
+        self._quiet_seconds = quiet_seconds
+        # Files taken for commit and not yet committed or restored, counted
+        # per batch, so the log keeps them until their commit lands
+        self._in_flight: Dict[str, int] = {}
+        self.debounce_minutes = debounce_minutes
+        # Debounced commits are handed to a single writer thread, so request
+        # handlers never wait on git
+        self._commit_queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._commit_worker, daemon=True)
+        self._worker.start()
+        self._log_path = log_path
+        self._log_lock = threading.Lock()
+
+    @property
+    def quiet_seconds(self) -> int:
+        return self._quiet_seconds
+
+    @quiet_seconds.setter
+    def quiet_seconds(self, seconds: int) -> None:
+        with self._lock:
+            self._quiet_seconds = seconds
+            self._reschedule()
+
+    @property
+    def debounce_minutes(self) -> int:
+        return self._debounce_minutes
+
+    @debounce_minutes.setter
+    def debounce_minutes(self, minutes: int) -> None:
+        with self._lock:
+            self._debounce_minutes = minutes
+            self._debounce_seconds = minutes * 60
+            self._set_oldest(self._oldest_ts)
+
+    def _set_oldest(self, ts: Optional[float]) -> None:
+        """Record the oldest pending timestamp and reschedule the flush."""
+        self._oldest_ts = ts
+        if ts is None:
+            self._newest_ts = None
+        self._reschedule()
+
+    def _reschedule(self) -> None:
+        """
+        Recompute the flush deadline.
+
+        Due after a quiet period with no changes, or once the oldest change has
+        waited the full debounce window, whichever comes first.
+        """
+        if self._oldest_ts is None:
+            self._flush_at = math.inf
+            return
+
+        flush_at = self._oldest_ts + self._debounce_seconds
+        if self._newest_ts is not None:
+            flush_at = min(flush_at, self._newest_ts + self._quiet_seconds)
+        self._flush_at = flush_at
 
     def mark_pending(self, filename: str) -> None:
         """
         Mark a file as having uncommitted changes.
 
-        Only records the first change timestamp - subsequent changes don't reset it.
-        This ensures files eventually get committed even with continuous edits.
+        Only records the first change timestamp per file - subsequent changes
+        don't reset it, so files get committed within debounce_minutes even with
+        continuous edits. Every change does restart the quiet period.
         """
-        if filename not in self._pending:
-            self._pending[filename] = time.time()
+        now = time.monotonic()
+        with self._lock:
+            self._newest_ts = now
+            added = filename not in self._pending
+            if added:
+                self._pending[filename] = now
+                self._files = None
+            if self._oldest_ts is None:
+                self._set_oldest(now)
+            else:
+                self._reschedule()
+        if added:
+            self._append_log(filename)
 
     def has_pending(self) -> bool:
         """Check if there are any pending commits."""
         return len(self._pending) > 0
 
-    def get_pending_files(self) -> list:
-        """Get list of files with pending commits."""
-        return list(self._pending.keys())
+    def get_pending_files(self) -> tuple:
+        """Get the files with pending commits, oldest first."""
+        files = self._files
+        if files is None:
+            with self._lock:
+                if self._files is None:
+                    self._files = tuple(self._pending)
+                files = self._files
+        return files
 
     def should_flush(self) -> bool:
         """
         Check if any pending commits are old enough to flush.
 
-        Returns True if the oldest pending change is older than debounce_minutes.
+        Returns True once nothing has changed for quiet_seconds, or the oldest
+        pending change is older than debounce_minutes.
         """
-        if not self._pending:
-            return False
-
-        oldest_time = min(self._pending.values())
-        age_minutes = (time.time() - oldest_time) / 60
-        return age_minutes >= self.debounce_minutes
+        return time.monotonic() >= self._flush_at
 
     def flush_if_ready(self, git_ops) -> Optional[dict]:
         """
-        Commit all pending files if the debounce period has passed.
+        Queue all pending files for commit if the debounce period has passed.
+
+        The commit itself happens on the writer thread.
 
         Args:
             git_ops: GitOps instance to use for committing.
 
         Returns:
-            Dict with commit info if committed, None otherwise.
+            Dict describing the queued batch, None if nothing was due.
         """
         if not self.should_flush():
             return None
 
-        return self.flush_all(git_ops)
+        batch = self._take_batch()
+        if not batch:
+            # Another request took it first
+            return None
+        self._commit_queue.put((git_ops, batch))
+
+        return {
+            'queued': True,
+            'files': tuple(batch),
+            'count': len(batch),
+        }
 
     def flush_all(self, git_ops) -> Optional[dict]:
         """
         Force commit all pending files regardless of debounce timer.
 
+        Waits for any queued commits first and commits on the calling thread.
+
         Args:
             git_ops: GitOps instance to use for committing.
 
         Returns:
             Dict with commit info if files were committed, None if nothing to commit.
         """
-        if not self._pending:
+        self.wait_drained()
+        batch = self._take_batch()
+        if not batch:
             return None
 
-        files = list(self._pending.keys())
-        count = len(files)
-
-        # Stage all pending files
+        result = None
         try:
-            for filename in files:
-                git_ops.repo.index.add([filename])
+            result = self._commit_batch(git_ops, batch)
+        finally:
+            try:
+                if result is None:
+                    self._restore_batch(git_ops, batch)
+            finally:
+                self._settle_batches([batch])
+        return result if result and result['committed'] else None
+
+    def wait_drained(self) -> None:
+        """Block until every queued commit has been written."""
+        self._commit_queue.join()
+
+    def _take_batch(self) -> Dict[str, float]:
+        """Detach the current pending files, leaving the manager empty."""
+        with self._lock:
+            batch = self._pending
+            self._pending = {}
+            self._files = None
+            self._set_oldest(None)
+            for filename in batch:
+                self._in_flight[filename] = self._in_flight.get(filename, 0) + 1
+        return batch
+
+    def _restore_batch(self, git_ops, batch: Dict[str, float]) -> None:
+        """Put an uncommitted batch back in front of anything marked since."""
+        # Files that are gone would only make every later flush fail again
+        kept = _existing_files(git_ops, batch)
+        # The batch predates every current entry, so this keeps oldest-first order
+        with self._lock:
+            restored = {name: batch[name] for name in kept}
+            for filename, ts in self._pending.items():
+                restored.setdefault(filename, ts)
+            self._pending = restored
+            self._files = None
+            self._set_oldest(next(iter(restored.values()), None))
+
+    def _settle_batches(self, batches: list) -> None:
+        """Drop finished batches from the in-flight files and rewrite the log."""
+        with self._lock:
+            for batch in batches:
+                for filename in batch:
+                    count = self._in_flight[filename] - 1
+                    if count:
+                        self._in_flight[filename] = count
+                    else:
+                        del self._in_flight[filename]
+        self._sync_log()
+
+    def _append_log(self, filename: str) -> None:
+        """Record a newly pending file in the log."""
+        if self._log_path is None:
+            return
 
-            # Create a single commit for all files
-            if count == 1:
-                message = f"Update: {files[0]}"
-            else:
-                message = f"Update {count} documents"
+        try:
+            with self._log_lock, open(self._log_path, 'a') as log:
+                log.write(f"{filename}\n")
+        except OSError as e:
+            print(f"Error recording pending file: {e}")
 
-            git_ops.repo.index.commit(message)
+    def _sync_log(self) -> None:
+        """Rewrite the log to hold only the files still pending or being committed."""
+        if self._log_path is None:
+            return
 
-            # Clear pending
-            self._pending.clear()
+        try:
+            with self._log_lock:
+                with self._lock:
+                    files = dict.fromkeys(self._pending)
+                    files.update(dict.fromkeys(self._in_flight))
+                _write_pending_log(self._log_path, files)
+        except OSError as e:
+            print(f"Error recording pending files: {e}")
+
+    def _commit_batch(self, git_ops, batch: Dict[str, float]) -> Optional[dict]:
+        """
+        Stage and commit a batch of files as a single commit.
 
-            return {
-                'committed': True,
-                'files': files,
-                'count': count,
-                'message': message
-            }
+        Returns a dict with 'committed' False if every file has since been
+        removed, or None if the commit failed.
+        """
+        for attempt in range(INDEX_LOCK_RETRIES + 1):
+            try:
+                with git_ops.lock:
+                    files = _existing_files(git_ops, batch)
+                    if not files:
+                        break
+                    message = _commit_message(files)
+                    # Stage all files in one call, so the index is read and written once
+                    index = _stage_files(git_ops, files)
+                    index.commit(message)
+                break
+            except COMMIT_ERRORS as e:
+                if attempt < INDEX_LOCK_RETRIES and _is_index_lock_error(e):
+                    time.sleep(INDEX_LOCK_BACKOFF * 2 ** attempt)
+                    continue
+                print(f"Error committing pending files: {e}")
+                return None
+
+        if not files:
+            return {'committed': False, 'files': (), 'count': 0}
+        return {
+            'committed': True,
+            'files': files,
+            'count': len(files),
+            'message': message
+        }
 
-        except Exception as e:
-            print(f"Error committing pending files: {e}")
-            return None
+    def _commit_worker(self) -> None:
+        """Writer thread: commit queued batches, coalescing any that pile up."""
+        while True:
+            git_ops, batch = self._commit_queue.get()
+            taken = [batch]
+            batch = dict(batch)
+            while True:
+                try:
+                    next_ops, next_batch = self._commit_queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken.append(next_batch)
+                for filename, ts in next_batch.items():
+                    batch.setdefault(filename, ts)
+                git_ops = next_ops
+
+            try:
+                result = self._commit_batch(git_ops, batch)
+            except Exception as e:
+                # Unexpected errors must not kill the writer thread
+                print(f"Error committing pending files: {e}")
+                result = None
+            try:
+                if result is None:
+                    self._restore_batch(git_ops, batch)
+            finally:
+                try:
+                    self._settle_batches(taken)
+                finally:
+                    for _ in taken:
+                        self._commit_queue.task_done()
 
     def clear_file(self, filename: str) -> None:
         """Remove a file from pending (e.g., after deletion)."""
-        self._pending.pop(filename, None)
+        with self._lock:
+            removed = self._pending.pop(filename, None)
+            if removed is not None:
+                self._files = None
+            if removed is not None and removed == self._oldest_ts:
+                self._set_oldest(next(iter(self._pending.values()), None))
 
     def get_stats(self) -> dict:
         """Get statistics about pending commits."""
-        if not self._pending:
+        files = self.get_pending_files()
+        oldest_ts = self._oldest_ts
+        if not files or oldest_ts is None:
             return {
                 'pending_count': 0,
                 'oldest_age_minutes': 0,
                 'files': []
             }
 
-        oldest_time = min(self._pending.values())
-        age_minutes = (time.time() - oldest_time) / 60
+        age_minutes = (time.monotonic() - oldest_ts) / 60
 
         return {
-            'pending_count': len(self._pending),
+            'pending_count': len(files),
             'oldest_age_minutes': round(age_minutes, 1),
-            'files': list(self._pending.keys())
+            'files': files
         }
 
 
@@ -141,6 +591,9 @@ def commit_uncommitted_on_startup(git_ops, repo_path: Path) -> Optional[dict]:
     Check for any uncommitted .md files and commit them on startup.
 
     This handles the case where the server was restarted with pending changes.
+    Skipped entirely if the last shutdown was clean and no note has changed
+    since. If the pending-files log survived, only the files it lists are
+    checked; otherwise every .md file in the repo root is.
 
     Args:
         git_ops: GitOps instance
@@ -152,33 +605,45 @@ def commit_uncommitted_on_startup(git_ops, repo_path: Path) -> Optional[dict]:
     if not git_ops.repo:
         return None
 
+    log_path = pending_log_path(repo_path)
     try:
-        # Get list of modified/untracked files
-        # Changed files (modified but not staged)
-        changed = [item.a_path for item in git_ops.repo.index.diff(None)]
-        # Untracked files
-        untracked = git_ops.repo.untracked_files
+        logged = _read_pending_log(log_path)
+        # Always consume the marker; it only counts if no pending log survived
+        clean = _clean_since_shutdown(repo_path)
+        if clean and logged is None:
+            return None
+
+        if logged is None:
+            pathspecs = (ROOT_MARKDOWN,)
+        else:
+            pathspecs = [f':(literal){name}' for name in logged]
 
-        # Filter to only .md files in root (not archive)
+        # Get list of modified/untracked files; the two git scans are
+        # independent, so run them side by side
         md_files = []
-        for f in changed + untracked:
-            if f.endswith('.md') and '/' not in f:
-                md_files.append(f)
+        if pathspecs:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                # Untracked files (root only - archive/ is never auto-committed)
+                untracked = pool.submit(_untracked_root_markdown, repo_path, pathspecs)
+                # Changed files (modified but not staged)
+                changed = _changed_root_markdown(repo_path, pathspecs)
+                untracked = untracked.result()
+
+            # Both lists are already limited to .md files in root (not archive)
+            md_files = changed + untracked
 
         if not md_files:
+            _write_pending_log(log_path, ())
             return None
 
-        # Stage and commit
-        for filename in md_files:
-            git_ops.repo.index.add([filename])
+        # Stage and commit (in one call, so the index is read and written once)
+        index = _stage_files(git_ops, md_files)
 
         count = len(md_files)
-        if count == 1:
-            message = f"Commit on startup: {md_files[0]}"
-        else:
-            message = f"Commit on startup: {count} documents"
+        message = _commit_message(md_files, STARTUP_MESSAGES)
 
-        git_ops.repo.index.commit(message)
+        index.commit(message)
+        _write_pending_log(log_path, ())
 
         return {
             'committed': True,